@@ -0,0 +1,785 @@
+# 성능 측정용 스크립트. 코드 동작에 중요하지 X.
+# 사용법: python benchmark.py <benchmark 이름> <wav 파일들...>
+
+import copy
+import os
+import sys
+import time
+sys.path.append(os.path.abspath('.'))
+
+
+def bench_timbre_latency(wav_paths, repeat=3):
+    """
+    TimbreEncoder cold start (checkpoint / config 로드) 와 warm call (encode) 소요 시간 비교.
+    """
+    from src.timbre_encoding.timbre_encoder import TimbreEncoder
+
+    encoder = TimbreEncoder()
+    for _ in range(repeat):
+        for wav_path in wav_paths:
+            encoder.encode(wav_path)
+    report = encoder.latency_report()
+    print(f"cold start: {report['cold_start_sec']:.3f}s / "
+          f"warm call: {report['mean_call_sec']:.3f}s (mean of {report['num_calls']})")
+    return report
+
+
+def bench_timbre_batch_size(wav_paths, batch_sizes=(1, 10, 32, 64, 128)):
+    """
+    SpkEncoderHelper.forward의 max_batch_size 별 files/sec 처리량 비교 (bulk catalog build 용도).
+    """
+    from src.timbre_encoding.timbre_encoder import TimbreEncoder
+
+    encoder = TimbreEncoder(max_batch_mb=None)
+    encoder.encode(wav_paths[0])  # warm up
+    results = {}
+    for batch_size in batch_sizes:
+        encoder.max_batch_size = batch_size
+        start = time.perf_counter()
+        encoder.encode_batch(wav_paths)
+        results[batch_size] = len(wav_paths) / (time.perf_counter() - start)
+        print(f"max_batch_size={batch_size}: {results[batch_size]:.2f} files/sec")
+    return results
+
+
+def bench_mel_frontend(wav_paths, repeat=3):
+    """
+    TorchMelSpectrogram (batch) 과 AudioProcessor.melspectrogram (librosa) 의 parity 확인 및 CPU 처리량 비교.
+    parity는 float64로 계산해 float32 반올림 오차 수준인지 확인.
+    """
+    import numpy as np
+    import torch
+    from src.timbre_encoding.timbre_encoder import SpkEncoderHelper
+    from utils.audio import TorchMelSpectrogram
+
+    ap = SpkEncoderHelper().speaker_encoder_ap
+    frontend = TorchMelSpectrogram(ap)
+    waveforms = [ap.load_wav(wav_path, sr=ap.sample_rate) for wav_path in wav_paths]
+    lengths = torch.tensor([len(wav) for wav in waveforms])
+    batch = torch.zeros(len(waveforms), int(lengths.max()), dtype=torch.float64)
+    for i, wav in enumerate(waveforms):
+        batch[i, :len(wav)] = torch.from_numpy(wav)
+
+    specs, frame_lengths = frontend(batch, lengths)
+    max_diff = max(
+        np.abs(specs[i, :, :frame_lengths[i]].numpy() - ap.melspectrogram(wav)).max() for i, wav in enumerate(waveforms)
+    )
+    print(f"parity (float64): max abs diff {max_diff:.2e}")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for wav in waveforms:
+            ap.melspectrogram(wav)
+    numpy_sec = (time.perf_counter() - start) / repeat
+    batch = batch.float()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        with torch.no_grad():
+            frontend(batch, lengths)
+    torch_sec = (time.perf_counter() - start) / repeat
+    audio_sec = float(lengths.sum()) / ap.sample_rate
+    print(f"librosa: {audio_sec / numpy_sec:.1f}x realtime / torch batch: {audio_sec / torch_sec:.1f}x realtime")
+    return max_diff, numpy_sec, torch_sec
+
+
+def bench_timbre_quantization(wav_paths, top_k=5):
+    """
+    fp32 / int8 (dynamic quantization) timbre encoder의 embedding cosine drift, latency,
+    그리고 corpus 내 L2 top-k 이웃 (FAISS IndexFlatL2 와 동일한 검색) 이 얼마나 유지되는지 비교.
+    """
+    import numpy as np
+    from src.timbre_encoding.timbre_encoder import TimbreEncoder
+
+    results = {}
+    for quantize in (False, True):
+        encoder = TimbreEncoder(use_cuda=False, quantize=quantize)
+        encoder.encode(wav_paths[0])  # warm up
+        start = time.perf_counter()
+        embeddings = encoder.encode_batch(wav_paths)
+        results[quantize] = (embeddings, time.perf_counter() - start)
+
+    (fp32, fp32_sec), (int8, int8_sec) = results[False], results[True]
+    cosine = np.sum(fp32 * int8, axis=1) / (np.linalg.norm(fp32, axis=1) * np.linalg.norm(int8, axis=1))
+    k = min(top_k, len(wav_paths))
+
+    def neighbors(embeddings):
+        distances = np.sum((embeddings[:, None] - embeddings[None]) ** 2, axis=-1)
+        return np.argsort(distances, axis=1)[:, :k]
+
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(neighbors(fp32), neighbors(int8))])
+    print(f"cosine(fp32, int8): mean {cosine.mean():.5f} / min {cosine.min():.5f}")
+    print(f"top-{k} neighbor overlap: {overlap:.3f}")
+    print(f"latency: fp32 {fp32_sec:.3f}s / int8 {int8_sec:.3f}s ({len(wav_paths)} files)")
+    return cosine, overlap, fp32_sec, int8_sec
+
+
+def bench_lstm_window_latency(wav_paths=None, batch_size=10, num_frames=250, repeat=10):
+    """
+    LSTMSpeakerEncoder window 당 latency 비교.
+    before: 매 forward마다 flatten_parameters() + 마지막 레이어 전체 time step projection 후 마지막 step 사용.
+    after: flatten_parameters() 로드 시 1회 + 마지막 레이어는 마지막 time step만 projection.
+    """
+    import torch
+    from src.timbre_encoding.models.lstm import LSTMSpeakerEncoder
+
+    model = LSTMSpeakerEncoder(80).eval()
+    model.flatten_parameters()
+    x = torch.randn(batch_size, num_frames, 80)
+
+    def before(x):
+        for layer in model.layers:
+            layer.lstm.flatten_parameters()
+            x = layer(x)
+        return torch.nn.functional.normalize(x[:, -1], p=2, dim=1)
+
+    results = {}
+    for name, fn in (('before', before), ('after', model.forward)):
+        with torch.no_grad():
+            fn(x)  # warm up
+            start = time.perf_counter()
+            for _ in range(repeat):
+                out = fn(x)
+        results[name] = (time.perf_counter() - start) / (repeat * batch_size)
+        print(f"{name}: {results[name] * 1000:.3f} ms / window")
+    with torch.no_grad():
+        print(f"max abs diff: {(before(x) - model.forward(x)).abs().max():.2e}")
+    return results
+
+
+def bench_timbre_backends(wav_paths, backends=('torch', 'torchscript', 'onnx')):
+    """
+    eager / TorchScript / ONNX Runtime backend 의 embedding parity (eager 대비 max abs diff) 와 latency 비교.
+    """
+    import numpy as np
+    from src.timbre_encoding.timbre_encoder import TimbreEncoder
+
+    results = {}
+    for backend in backends:
+        encoder = TimbreEncoder(use_cuda=False, backend=backend)
+        encoder.encode(wav_paths[0])  # warm up
+        start = time.perf_counter()
+        results[backend] = (encoder.encode_batch(wav_paths), time.perf_counter() - start)
+
+    reference = results[backends[0]][0]
+    for backend, (embeddings, elapsed) in results.items():
+        print(f"{backend}: {elapsed:.3f}s / max abs diff vs {backends[0]}: {np.abs(embeddings - reference).max():.2e}")
+    return results
+
+
+def bench_timbre_num_eval(wav_paths, settings=((250, 10), (250, 5), (250, 3), (250, 1), (160, 10), (160, 5))):
+    """
+    (num_frames, num_eval) 설정 별 속도와 embedding 안정성 (기본값 (250, 10) 대비 cosine) 비교.
+    """
+    import numpy as np
+    from src.timbre_encoding.timbre_encoder import TimbreEncoder
+
+    encoder = TimbreEncoder(use_cuda=False)
+    encoder.encode(wav_paths[0])  # warm up
+    results = {}
+    for num_frames, num_eval in settings:
+        start = time.perf_counter()
+        embeddings = encoder.encode_batch(wav_paths, num_frames=num_frames, num_eval=num_eval)
+        results[(num_frames, num_eval)] = (embeddings, time.perf_counter() - start)
+
+    reference = results[settings[0]][0]
+    for (num_frames, num_eval), (embeddings, elapsed) in results.items():
+        cosine = np.sum(embeddings * reference, axis=1)
+        print(f"num_frames={num_frames}, num_eval={num_eval}: {elapsed:.3f}s / "
+              f"cosine vs {settings[0]}: mean {cosine.mean():.5f}, min {cosine.min():.5f}")
+    return results
+
+
+def bench_windowed_mel(wav_paths, num_frames=250, num_eval=10):
+    """
+    전체 melspectrogram 후 window slicing vs window 구간만 STFT (melspectrogram_frames) 의 CPU 시간 / peak 메모리 비교.
+    """
+    import tracemalloc
+    import numpy as np
+    from src.timbre_encoding.timbre_encoder import SpkEncoderHelper
+
+    helper = SpkEncoderHelper()
+    ap = helper.speaker_encoder_ap
+    for wav_path in wav_paths:
+        waveform = helper.load_waveform(wav_path)
+        max_len = 1 + len(waveform) // ap.hop_length
+        offsets, _, window_frames = helper.speaker_encoder.get_window_offsets(max_len, num_frames, num_eval)
+
+        def full():
+            spec = ap.melspectrogram(waveform)
+            return [spec[:, offset:offset + window_frames] for offset in offsets]
+
+        def windowed():
+            return [ap.melspectrogram_frames(waveform, offset, window_frames) for offset in offsets]
+
+        stats = {}
+        for name, fn in (('full', full), ('windowed', windowed)):
+            tracemalloc.start()
+            start = time.process_time()
+            windows = fn()
+            stats[name] = (time.process_time() - start, tracemalloc.get_traced_memory()[1] / 1024 ** 2, windows)
+            tracemalloc.stop()
+        max_diff = max(np.abs(a - b).max() for a, b in zip(stats['full'][2], stats['windowed'][2]))
+        print(f"{os.path.basename(wav_path)} ({len(waveform) / ap.sample_rate:.0f}s): "
+              f"full {stats['full'][0]:.3f}s / {stats['full'][1]:.1f}MB, "
+              f"windowed {stats['windowed'][0]:.3f}s / {stats['windowed'][1]:.1f}MB, max abs diff {max_diff:.1e}")
+
+
+def bench_audio_processor_init(wav_paths=None, repeat=10):
+    """
+    utils.audio.AudioProcessor 생성자 시간: 첫 생성 (mel basis 계산) vs 이후 생성 (공유 cache 사용).
+    """
+    from utils.audio import AudioProcessor
+    from utils.config import SpeakerEncoderConfig
+    from utils.read_json import read_json
+    from src.timbre_encoding.timbre_encoder import PRETRAINED_DIR
+
+    config = SpeakerEncoderConfig()
+    config.from_dict(read_json(os.path.join(PRETRAINED_DIR, 'config.json')))
+    start = time.perf_counter()
+    AudioProcessor(**config.audio, verbose=False)
+    first_sec = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeat):
+        AudioProcessor(**config.audio, verbose=False)
+    cached_sec = (time.perf_counter() - start) / repeat
+    print(f"first: {first_sec * 1000:.2f} ms / cached: {cached_sec * 1000:.3f} ms")
+    return first_sec, cached_sec
+
+
+def bench_pitch_gating(wav_paths, engine=None):
+    """
+    detect_pitch_range에서 RMS gating / trimming을 pitch 추정 전 (gate_before_pitch=True) 과 후에 적용했을 때
+    곡 별 pitch frame 수, 소요 시간, note range 비교. wav_paths는 분리된 vocal stem.
+    """
+    from src.pitch_detecting.audio_processor import AudioProcessor
+
+    results = {}
+    for wav_path in wav_paths:
+        row = {}
+        for gate in (False, True):
+            processor = AudioProcessor(None, os.path.dirname(wav_path), pitch_engine=engine)
+            processor.vocal_wav_path = wav_path
+            processor.gate_before_pitch = gate
+            start = time.perf_counter()
+            note_range = processor.detect_pitch_range()
+            row[gate] = (processor.pitch_frame_counts[1], time.perf_counter() - start, note_range)
+        results[wav_path] = row
+        (before, before_sec, before_range), (after, after_sec, after_range) = row[False], row[True]
+        print(f"{os.path.basename(wav_path)}: frames {before} -> {after} ({after / before:.1%}), "
+              f"{before_sec:.2f}s -> {after_sec:.2f}s, range {before_range} / {after_range}")
+    return results
+
+
+def bench_pitch_decoders(wav_paths, engine='accurate', decoders=('viterbi', 'banded_viterbi', 'local', 'median')):
+    """
+    같은 CREPE activation에 대해 디코딩 방식 별 소요 시간과 (min_note, max_note) 가 'viterbi' 대비 바뀐 곡 수 비교.
+    wav_paths는 분리된 vocal stem.
+    """
+    import librosa
+    from src.pitch_detecting.audio_processor import AudioProcessor
+    from src.pitch_detecting.pitch_engines import get_pitch_engine
+    from utils.vad import FrameEnergy
+
+    crepe_engine = get_pitch_engine(engine)
+    seconds = {decoder: 0.0 for decoder in decoders}
+    changed = {decoder: 0 for decoder in decoders}
+    for wav_path in wav_paths:
+        processor = AudioProcessor(None, os.path.dirname(wav_path))
+        processor.audio, processor.sr = librosa.load(wav_path, sr=None)
+        processor.energy = FrameEnergy(processor.audio, processor.sr)
+        frame_time, activation, index = crepe_engine.activation(processor.audio, processor.sr, processor.pitch_frame_mask)
+        ranges = {}
+        for decoder in decoders:
+            start = time.perf_counter()
+            frequency, _ = crepe_engine.decode(len(frame_time), activation, index, decoder=decoder)
+            seconds[decoder] += time.perf_counter() - start
+            ranges[decoder] = processor.pitch_to_note_range(frame_time, frequency)
+            changed[decoder] += ranges[decoder] != ranges[decoders[0]]
+        print(f"{os.path.basename(wav_path)}: {ranges}")
+    for decoder in decoders:
+        print(f"{decoder}: {seconds[decoder]:.3f}s, range changed {changed[decoder]} / {len(wav_paths)} songs")
+    return seconds, changed
+
+
+def bench_pitch_chunked(wav_paths, chunk_durations=(None, 60, 30), engine=None):
+    """
+    detect_pitch_range의 chunk_duration 별 numpy peak 메모리 (tracemalloc), 소요 시간, note range 비교.
+    wav_paths는 분리된 vocal stem. None은 전체 신호를 한 번에 처리.
+    """
+    import tracemalloc
+    from src.pitch_detecting.audio_processor import AudioProcessor
+
+    results = {}
+    for wav_path in wav_paths:
+        for chunk_duration in chunk_durations:
+            processor = AudioProcessor(None, os.path.dirname(wav_path), pitch_engine=engine)
+            processor.vocal_wav_path = wav_path
+            processor.chunk_duration = chunk_duration
+            tracemalloc.start()
+            start = time.perf_counter()
+            note_range = processor.detect_pitch_range()
+            elapsed = time.perf_counter() - start
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+            results[(wav_path, chunk_duration)] = (peak_mb, elapsed, note_range)
+            print(f"{os.path.basename(wav_path)} chunk={chunk_duration}: peak {peak_mb:.1f} MB, {elapsed:.2f}s, range {note_range}")
+    return results
+
+
+def bench_pitch_batch(wav_paths, engine=None, batch_size=512):
+    """
+    곡 단위 순차 detect_pitch_range 대비 detect_pitch_ranges (여러 곡 frame을 모아 CREPE batch 실행) 의 pitch 단계 songs/min 비교.
+    batch size 효과와 곡 간 batching 효과를 분리하기 위해 두 경로 모두 같은 batch_size로 실행. wav_paths는 분리된 vocal stem.
+    """
+    from src.pitch_detecting.audio_processor import AudioProcessor, detect_pitch_ranges
+    from src.pitch_detecting.pitch_engines import get_pitch_engine
+
+    def make_processors(pitch_engine):
+        processors = []
+        for wav_path in wav_paths:
+            processor = AudioProcessor(None, os.path.dirname(wav_path), pitch_engine=pitch_engine)
+            processor.vocal_wav_path = wav_path
+            processors.append(processor)
+        return processors
+
+    pitch_engine = get_pitch_engine(engine)
+    if getattr(pitch_engine, 'batch_size', None) is not None:
+        pitch_engine = copy.copy(pitch_engine)
+        pitch_engine.batch_size = batch_size
+    start = time.perf_counter()
+    sequential = []
+    for processor in make_processors(pitch_engine):
+        try:
+            sequential.append(processor.detect_pitch_range())
+        except ValueError:
+            sequential.append(None)
+    sequential_spm = len(wav_paths) / (time.perf_counter() - start) * 60
+
+    start = time.perf_counter()
+    batched = detect_pitch_ranges(make_processors(pitch_engine), batch_size=batch_size)
+    batched_spm = len(wav_paths) / (time.perf_counter() - start) * 60
+
+    print(f"batch_size {batch_size}: sequential {sequential_spm:.2f} songs/min / batched {batched_spm:.2f} songs/min, "
+          f"same ranges: {sequential == batched}")
+    return sequential_spm, batched_spm
+
+
+def _crepe_backend_worker(backend, capacity, wav_paths):
+    """bench_crepe_backends 용 (새 프로세스에서 실행): startup 시간, peak RSS, 오디오 1초 당 latency, 곡 별 출력."""
+    import resource
+    start = time.perf_counter()
+    import librosa
+    import numpy as np
+    from src.pitch_detecting.pitch_engines import CrepeEngine
+
+    engine = CrepeEngine(capacity, verbose=0, backend=backend)
+    engine.run_model(np.zeros((1, 1024), dtype=np.float32))
+    startup_sec = time.perf_counter() - start
+
+    seconds, audio_seconds, outputs = 0.0, 0.0, []
+    for wav_path in wav_paths:
+        audio, sr = librosa.load(wav_path, sr=None)
+        start = time.perf_counter()
+        frame_time, activation, index = engine.activation(audio, sr)
+        frequency, _ = engine.decode(len(frame_time), activation, index)
+        seconds += time.perf_counter() - start
+        audio_seconds += len(audio) / sr
+        outputs.append((activation, frequency))
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return startup_sec, rss_mb, seconds / audio_seconds, outputs
+
+
+def bench_crepe_backends(wav_paths, capacity='full', backends=('tensorflow', 'onnx', 'tflite')):
+    """
+    CREPE 실행기 별 (각각 새 프로세스) startup 시간, peak RSS, 오디오 1초 당 latency, tensorflow 대비 activation / frequency 최대 차이.
+    onnx / tflite export 파일이 없으면 첫 실행에서 export (tensorflow 필요) 하므로 미리 한 번 실행해 둘 것.
+    """
+    import multiprocessing
+    import numpy as np
+
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for backend in backends:
+        with context.Pool(1) as pool:
+            results[backend] = pool.apply(_crepe_backend_worker, (backend, capacity, wav_paths))
+    reference = results[backends[0]][3]
+    for backend, (startup_sec, rss_mb, latency, outputs) in results.items():
+        activation_diff = max(np.abs(a - ra).max() for (a, _), (ra, _) in zip(outputs, reference))
+        frequency_diff = max(np.abs(f - rf).max() for (_, f), (_, rf) in zip(outputs, reference))
+        print(f"{backend}: startup {startup_sec:.2f}s, peak RSS {rss_mb:.0f} MB, {latency * 1000:.1f} ms / audio sec, "
+              f"max diff activation {activation_diff:.2e} / frequency {frequency_diff:.2e} Hz")
+    return results
+
+
+def bench_separator_latency(wav_paths):
+    """
+    demucs.separate.main (CLI, 호출마다 모델 로드 + 두 stem 저장) 대비 DemucsSeparator의 cold start / 곡 당 separate 시간 비교.
+    """
+    import shlex
+    import tempfile
+    import demucs.separate
+    from src.pitch_detecting.separator import DemucsSeparator
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        for wav_path in wav_paths:
+            demucs.separate.main(shlex.split(f'--two-stems vocals -n htdemucs -o {output_dir} "{wav_path}"'))
+        cli_sec = (time.perf_counter() - start) / len(wav_paths)
+
+    separator = DemucsSeparator()
+    for wav_path in wav_paths:
+        separator.separate_file(wav_path)
+    report = separator.latency_report()
+    print(f"cli: {cli_sec:.2f}s / song, separator: cold start {report['cold_start_sec']:.2f}s, "
+          f"{report['mean_call_sec']:.2f}s / song (mean of {report['num_calls']})")
+    return cli_sec, report
+
+
+def _analyse_vocals(processor):
+    """separation_plan / separation_tiers 용: separate_vocals 후 (분리 시간, note range, timbre embedding)."""
+    import numpy as np
+    from src.pitch_detecting.separator import get_separator
+    from src.timbre_encoding.timbre_encoder import timbre_enc
+
+    processor.separate_vocals(mode='user')
+    separate_sec = get_separator(processor.separator).last_call_sec
+    note_range = processor.detect_pitch_range()
+    embedding = np.asarray(timbre_enc(processor.vocal_source())).ravel()
+    return separate_sec, note_range, embedding
+
+
+def _cosine(a, b):
+    import numpy as np
+
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def bench_separation_plan(wav_paths, plans=(('auto', None), ('auto', 4), ('auto', 2)), engine=None):
+    """
+    전체 곡 분리 대비 analysis_plan 구간 분리 (plans: (analysis_plan, num_excerpts)) 의 분리 시간, note range,
+    timbre embedding cosine 유사도 비교. wav_paths는 분리 전 원곡.
+    """
+    from src.pitch_detecting.audio_processor import AudioProcessor
+
+    results = {}
+    for wav_path in wav_paths:
+        row = {}
+        for plan, num_excerpts in ((None, None),) + tuple(plans):
+            processor = AudioProcessor(None, os.path.dirname(wav_path), original_wav_path=wav_path, pitch_engine=engine)
+            processor.analysis_plan, processor.num_excerpts = plan, num_excerpts
+            row[(plan, num_excerpts)] = _analyse_vocals(processor)
+        results[wav_path] = row
+        full_sec, full_range, full_embedding = row[(None, None)]
+        print(f"{os.path.basename(wav_path)}: full {full_sec:.2f}s, range {full_range}")
+        for (plan, num_excerpts), (sec, note_range, embedding) in row.items():
+            if plan is None:
+                continue
+            print(f"  {plan} x {num_excerpts or 'all'}: {sec:.2f}s ({sec / full_sec:.1%}), range {note_range} "
+                  f"({'same' if note_range == full_range else 'diff'}), timbre cosine {_cosine(embedding, full_embedding):.4f}")
+    return results
+
+
+def bench_separation_tiers(wav_paths, tiers=('accurate', 'light', 'fast'), engine=None):
+    """
+    분리 tier 별 (첫 tier 기준) 분리 시간, note range, timbre embedding cosine 유사도 비교. wav_paths는 분리 전 원곡.
+    tier 별 모델 로드 시간은 첫 곡에서 빠지도록 get_separator()로 미리 로드.
+    """
+    from src.pitch_detecting.audio_processor import AudioProcessor
+    from src.pitch_detecting.separator import get_separator
+
+    for tier in tiers:
+        print(f"{tier}: cold start {get_separator(tier).cold_start_sec:.2f}s")
+    results = {}
+    for wav_path in wav_paths:
+        row = {}
+        for tier in tiers:
+            processor = AudioProcessor(None, os.path.dirname(wav_path), original_wav_path=wav_path, pitch_engine=engine,
+                                       separator=tier)
+            row[tier] = _analyse_vocals(processor)
+        results[wav_path] = row
+        reference_sec, reference_range, reference_embedding = row[tiers[0]]
+        print(f"{os.path.basename(wav_path)}:")
+        for tier, (sec, note_range, embedding) in row.items():
+            print(f"  {tier}: {sec:.2f}s ({sec / reference_sec:.1%}), range {note_range} "
+                  f"({'same' if note_range == reference_range else 'diff'}), "
+                  f"timbre cosine {_cosine(embedding, reference_embedding):.4f}")
+    return results
+
+
+def _separator_parallel_worker(wav_path, duration, num_workers, max_rss_mb):
+    """bench_separator_parallel 용 (새 프로세스에서 실행): wav_path를 duration 길이로 반복해 분리. (소요 시간, peak RSS, worker 수)"""
+    import resource
+    import numpy as np
+    import soundfile as sf
+    from src.pitch_detecting.separator import DemucsSeparator
+
+    wav, sr = sf.read(wav_path, dtype='float32', always_2d=True)
+    wav = np.tile(wav.T, (1, int(np.ceil(duration * sr / len(wav)))))[:, :int(duration * sr)]
+    separator = DemucsSeparator()
+    if num_workers:
+        separator.separate_chunked(wav, sr, num_workers=num_workers, max_rss_mb=max_rss_mb)
+    else:
+        separator.separate(wav, sr)
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return separator.last_call_sec, rss_mb, separator.last_num_workers
+
+
+def bench_separator_parallel(wav_paths, durations=(180, 600, 3600), workers=(None, 2, 4, 8), max_rss_mb=None):
+    """
+    3 / 10 / 60분 입력 (wav_paths[0]을 반복) 에 대해 separate() (workers None) 와 separate_chunked() worker 수 별
+    소요 시간 / peak RSS 비교. 설정마다 새 프로세스에서 실행.
+    """
+    import multiprocessing
+
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for duration in durations:
+        for num_workers in workers:
+            with context.Pool(1) as pool:
+                seconds, rss_mb, used_workers = pool.apply(_separator_parallel_worker,
+                                                           (wav_paths[0], duration, num_workers, max_rss_mb))
+            results[(duration, num_workers)] = (seconds, rss_mb, used_workers)
+            print(f"{duration / 60:.0f} min, {'serial' if num_workers is None else f'{used_workers} workers'}: "
+                  f"{seconds:.1f}s ({seconds / duration:.3f}x realtime), peak RSS {rss_mb:.0f} MB")
+    return results
+
+
+def bench_skip_separation(wav_paths, residual_threshold=0.1, separator=None):
+    """
+    needs_separation 임계값 보정. wav_paths는 사용자 녹음 (반주 있는 것 / 없는 것 섞어서).
+    곡 별로 separation_features와 실제 분리 결과의 잔차 비율 (|mix - vocals|^2 / |mix|^2) 을 계산해
+    잔차가 residual_threshold 이하인 녹음 (분리해도 거의 안 바뀜) 을 '생략 가능'으로 보고,
+    생략하면 안 되는 녹음을 하나도 생략하지 않는 임계값 중 생략 가능 녹음을 가장 많이 생략하는 조합 출력
+    (SKIP_SEPARATION_THRESHOLDS에 반영).
+    """
+    import itertools
+    import numpy as np
+    import soundfile as sf
+    import librosa
+    from src.pitch_detecting.separator import get_separator, separation_features, needs_separation, SKIP_SEPARATION_THRESHOLDS
+
+    separator = get_separator(separator)
+    rows = []
+    for wav_path in wav_paths:
+        wav, sr = sf.read(wav_path, dtype='float32', always_2d=True)
+        start = time.perf_counter()
+        features = separation_features(wav.T, sr)
+        analysis_sec = time.perf_counter() - start
+        vocals = separator.separate(wav.T, sr).mean(0).numpy()
+        mix = librosa.resample(wav.mean(axis=1), orig_sr=sr, target_sr=separator.samplerate)[:len(vocals)]
+        residual = float(np.sum((mix - vocals[:len(mix)]) ** 2) / (np.sum(mix ** 2) + 1e-12))
+        rows.append((wav_path, features, residual, analysis_sec, separator.last_call_sec))
+        print(f"{os.path.basename(wav_path)}: {({k: round(v, 4) for k, v in features.items()})}, residual {residual:.3f} "
+              f"({'clean' if residual <= residual_threshold else 'mix'}), analysis {analysis_sec:.2f}s "
+              f"vs separation {separator.last_call_sec:.2f}s, default rule: "
+              f"{'separate' if needs_separation(features) else 'skip'}")
+
+    clean = np.array([residual <= residual_threshold for _, _, residual, _, _ in rows])
+    values = {name: np.array([features[name] for _, features, _, _, _ in rows]) for name in SKIP_SEPARATION_THRESHOLDS}
+
+    def candidates(name):
+        # 관측값 사이 중간점 + 양 끝 (모두 허용 / 모두 거부)
+        v = np.unique(values[name])
+        return np.concatenate([[v[0] - 1e-6], (v[1:] + v[:-1]) / 2, [v[-1] + 1e-6]])
+
+    best = None
+    for flatness, harmonic_db, low_band in itertools.product(*(candidates(name) for name in ('flatness', 'harmonic_db', 'low_band'))):
+        skip = (values['flatness'] <= flatness) & (values['harmonic_db'] >= harmonic_db) & (values['low_band'] <= low_band)
+        score = (-int(np.sum(skip & ~clean)), int(np.sum(skip & clean)))
+        if best is None or score > best[0]:
+            best = (score, {'flatness': float(flatness), 'harmonic_db': float(harmonic_db), 'low_band': float(low_band)})
+    (false_skips, true_skips), thresholds = (-best[0][0], best[0][1]), best[1]
+    saved_sec = sum(separation_sec - analysis_sec for (_, _, residual, analysis_sec, separation_sec), is_clean
+                    in zip(rows, clean) if is_clean)
+    print(f"calibrated thresholds: {thresholds}")
+    print(f"  skips {true_skips} / {int(clean.sum())} clean recordings, {false_skips} mixes wrongly skipped, "
+          f"up to {saved_sec:.1f}s saved over {len(rows)} recordings")
+    return thresholds, rows
+
+
+def bench_stem_cache(wav_paths, separator=None, cache_dir='./data/bench_stem_cache', formats=('npz', 'flac')):
+    """
+    stem cache 유무에 따른 separate_vocals 소요 시간 (cold: 분리 + 저장, warm: cache hit) 과
+    저장 형식 별 cache 크기 / 저장 전후 최대 오차. 마지막에 작은 max_mb로 LRU eviction 확인.
+    """
+    import shutil
+    import numpy as np
+    from src.pitch_detecting.audio_processor import AudioProcessor
+    from src.pitch_detecting.stem_cache import StemCache
+
+    def run(wav_path, cache):
+        processor = AudioProcessor(None, './data', original_wav_path=wav_path, separator=separator)
+        processor.skip_clean_separation = False
+        processor.stem_cache = cache if cache is not None else False
+        processor.origin_audio, processor.origin_sr = processor.read_audio(wav_path)
+        start = time.perf_counter()
+        processor.separate_vocals(mode='user')
+        return time.perf_counter() - start, processor
+
+    results = {}
+    for fmt in formats:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        cache = StemCache(cache_dir, format=fmt)
+        for wav_path in wav_paths:
+            reference_sec, _ = run(wav_path, None)
+            cold_sec, cold = run(wav_path, cache)
+            warm_sec, warm = run(wav_path, cache)
+            assert warm.stem_cache_hit
+            # shifts > 0이면 분리 결과 자체가 실행마다 달라지므로 저장 오차는 cold 결과 기준
+            error = float(np.abs(warm.vocal_audio - cold.vocal_audio).max())
+            results[(fmt, wav_path)] = (reference_sec, cold_sec, warm_sec, error)
+            print(f"[{fmt}] {os.path.basename(wav_path)}: no cache {reference_sec:.2f}s, cold {cold_sec:.2f}s, "
+                  f"warm {warm_sec:.3f}s ({reference_sec / warm_sec:.0f}x), max abs error {error:.2e}")
+        print(f"[{fmt}] {cache.stats()}")
+
+        # 항목 하나 크기보다 작은 상한 -> 가장 오래 안 쓴 항목부터 삭제되어 마지막 항목만 남아야 함
+        entry_bytes = max(size for _, size, _ in cache.entries())
+        cache.max_bytes = entry_bytes
+        removed = cache.evict()
+        print(f"[{fmt}] evicted {removed} with max_bytes={entry_bytes}, {cache.stats()['entries']} left")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    return results
+
+
+def bench_audio_context(wav_paths, engine=None):
+    """
+    vocal stem 별로 기존 단계 별 decode / resample (pitch: librosa.load(sr=None) + CREPE 내부 resampy,
+    timbre: librosa.load(sr=16000)) 과 AudioContext 공유 (decode 한 번 + 16 kHz resample 한 번) 의 소요 시간 비교.
+    CREPE에 AudioContext의 16 kHz view를 넘긴 note range가 엔진 내부 resampy 결과와 같은지도 확인.
+    """
+    import librosa
+    from resampy import resample
+    from src.pitch_detecting.audio_processor import AudioProcessor
+    from utils.audio import AudioContext
+
+    results = {}
+    for wav_path in wav_paths:
+        start = time.perf_counter()
+        audio, sr = librosa.load(wav_path, sr=None)
+        resample(audio, sr, 16000)
+        librosa.load(wav_path, sr=16000)
+        legacy_sec = time.perf_counter() - start
+
+        start = time.perf_counter()
+        context = AudioContext.from_file(wav_path)
+        context.resampled(16000)  # pitch
+        context.resampled(16000)  # timbre (memoized)
+        shared_sec = time.perf_counter() - start
+
+        processor = AudioProcessor(None, os.path.dirname(wav_path), pitch_engine=engine)
+        processor.vocal_wav_path = wav_path
+        shared_range = processor.detect_pitch_range()
+        pitch_engine = processor.get_pitch_engine()
+        frame_filter = processor.load_vocal()
+        processor.time, processor.frequency, _ = pitch_engine.predict(processor.audio, processor.sr, frame_filter=frame_filter)
+        legacy_range = processor.pitch_to_note_range(processor.time, processor.frequency)
+
+        results[wav_path] = (legacy_sec, shared_sec, context.num_resamples, legacy_range, shared_range)
+        print(f"{os.path.basename(wav_path)}: decode + resample {legacy_sec:.2f}s -> {shared_sec:.2f}s "
+              f"({context.num_resamples} resample), range {legacy_range} / {shared_range}")
+    return results
+
+
+def bench_decode(paths, sr=44100, channels=2, offset=30.0, duration=30.0):
+    """
+    압축 원곡 (webm / m4a / mp3 / flac) 별로 기존 방식 (ffmpeg으로 wav 파일 변환 후 soundfile로 읽기) 과
+    ffmpeg pipe decode (utils.decode.decode_audio) 의 소요 시간 / 중간 파일 크기 비교, 두 결과의 최대 오차 및
+    offset / duration 구간 decode가 전체 decode의 같은 구간과 맞는지 확인.
+    """
+    import subprocess
+    import tempfile
+    import numpy as np
+    import soundfile as sf
+    from utils.decode import FFMPEG, decode_audio
+
+    results = {}
+    for path in paths:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            wav_path = os.path.join(tmp_dir, 'origin.wav')
+            start = time.perf_counter()
+            subprocess.run([FFMPEG, '-nostdin', '-v', 'error', '-i', path, '-ac', str(channels), '-ar', str(sr), wav_path],
+                           check=True)
+            legacy, _ = sf.read(wav_path, dtype='float32', always_2d=True)
+            legacy_sec = time.perf_counter() - start
+            wav_mb = os.path.getsize(wav_path) / 1024 ** 2
+
+        start = time.perf_counter()
+        wav, _ = decode_audio(path, sr=sr, channels=channels)
+        pipe_sec = time.perf_counter() - start
+        error = float(np.abs(wav.T - legacy).max()) if wav.shape[::-1] == legacy.shape else float('nan')
+
+        window, _ = decode_audio(path, sr=sr, channels=channels, offset=offset, duration=duration)
+        reference = wav[:, int(offset * sr):int(offset * sr) + window.shape[1]]
+        window_error = float(np.abs(window - reference).max()) if window.shape == reference.shape else float('nan')
+
+        results[path] = (legacy_sec, pipe_sec, error, window_error)
+        print(f"{os.path.basename(path)} ({os.path.getsize(path) / 1024 ** 2:.1f} MB): wav file {legacy_sec:.2f}s "
+              f"(+{wav_mb:.1f} MB on disk) -> pipe {pipe_sec:.2f}s, max abs error {error:.1e}, "
+              f"{duration:.0f}s window at {offset:.0f}s error {window_error:.1e}")
+    return results
+
+
+def bench_gated_decode(wav_paths, engine='accurate', decoders=('viterbi', 'banded_viterbi'), rms_threshold=None):
+    """
+    같은 CREPE activation을 (a) 전체 track으로 디코딩 후 gating mask 적용 (b) gating에서 살아남은 frame만 구간 별로 디코딩
+    (gate_before_pitch의 CrepeEngine.decode) 했을 때 frame 별 차이 (50 cents 이상 다른 frame 비율) 와 note range 비교.
+    wav_paths는 분리된 vocal stem. rms_threshold: gating 임계값 (None이면 AudioProcessor 기본값, 높일수록 구간이 잘게 나뉨).
+    """
+    import numpy as np
+    from src.pitch_detecting.audio_processor import AudioProcessor
+    from src.pitch_detecting.pitch_engines import get_pitch_engine
+
+    crepe_engine = get_pitch_engine(engine)
+    results = {}
+    for wav_path in wav_paths:
+        processor = AudioProcessor(None, os.path.dirname(wav_path))
+        processor.vocal_wav_path = wav_path
+        processor.rms_threshold = rms_threshold or processor.rms_threshold
+        processor.load_vocal()
+        time_, activation, _ = crepe_engine.activation(*processor.engine_audio(crepe_engine))
+        keep = processor.pitch_frame_mask(time_)
+        index = np.flatnonzero(keep)
+        for decoder in decoders:
+            full, _ = crepe_engine.decode(len(time_), activation, np.arange(len(time_)), decoder=decoder)
+            full[~keep] = np.nan
+            gated, _ = crepe_engine.decode(len(time_), activation[index], index, decoder=decoder)
+            both = keep & ~np.isnan(full) & ~np.isnan(gated) & (full > 0) & (gated > 0)
+            changed = float(np.mean(np.abs(1200 * np.log2(full[both] / gated[both])) >= 50)) if both.any() else 0.0
+            full_range = processor.pitch_to_note_range(time_, full)
+            gated_range = processor.pitch_to_note_range(time_, gated)
+            results[(wav_path, decoder)] = (changed, full_range, gated_range)
+            print(f"{os.path.basename(wav_path)} [{decoder}]: {len(np.split(index, np.flatnonzero(np.diff(index) != 1) + 1))} runs, "
+                  f"{changed:.2%} frames >= 50 cents apart, range {full_range} (full) / {gated_range} (gated)")
+    return results
+
+
+BENCHMARKS = {
+    'timbre_latency': bench_timbre_latency,
+    'timbre_batch_size': bench_timbre_batch_size,
+    'mel_frontend': bench_mel_frontend,
+    'timbre_quantization': bench_timbre_quantization,
+    'lstm_window_latency': bench_lstm_window_latency,
+    'timbre_backends': bench_timbre_backends,
+    'timbre_num_eval': bench_timbre_num_eval,
+    'windowed_mel': bench_windowed_mel,
+    'audio_processor_init': bench_audio_processor_init,
+    'pitch_gating': bench_pitch_gating,
+    'pitch_decoders': bench_pitch_decoders,
+    'gated_decode': bench_gated_decode,
+    'pitch_chunked': bench_pitch_chunked,
+    'pitch_batch': bench_pitch_batch,
+    'crepe_backends': bench_crepe_backends,
+    'separator_latency': bench_separator_latency,
+    'separation_plan': bench_separation_plan,
+    'separator_parallel': bench_separator_parallel,
+    'separation_tiers': bench_separation_tiers,
+    'skip_separation': bench_skip_separation,
+    'stem_cache': bench_stem_cache,
+    'audio_context': bench_audio_context,
+    'decode': bench_decode,
+}
+
+
+if __name__ == "__main__":
+    name, paths = sys.argv[1], sys.argv[2:]
+    BENCHMARKS[name](paths)
@@ -70,7 +70,7 @@ def initializing():
     return key_calculator, faiss_index, sbert, current_dir, save_dir
 
 
-def get_user_pitch_range_from_wav(obj, wav_path, save_dir='./data'):
+def get_user_pitch_range_from_wav(obj, wav_path, save_dir='./data', return_decision=False):
     """
     사용자 녹음 파일을 제공해주었을때 음색 유사도 측정해 노래 추천 set 출력하는 함수.
     웹 페이지 level에서 피치 파악 후 범위를 직접 기입해 주는 방식이 아닐 경우, 피치 범위 값 뽑는데에도 사용 가능.
@@ -78,6 +78,7 @@ def get_user_pitch_range_from_wav(obj, wav_path, save_dir='./data'):
     input:
         - wav_path (str): 사용자 목소리 녹음 wav 파일 저장 경로.
         - save_dir (str): 파일 취급 중 생성되는 중간 파일들 임시 저장할 경로. 프로세스 종료 후 clean_up 함.
+        - return_decision (bool): True면 vocal 분리 생략 판단 결과도 함께 반환.
 
     output:
         - user_range_ (Tuple: (str, str)): 사용자 피치 범위. Note 표기 방식으로 튜플 구간의 형태로 제공.
@@ -89,12 +90,16 @@ def get_user_pitch_range_from_wav(obj, wav_path, save_dir='./data'):
             ['yt_id(3)', 'yt_title(3)', (A3, B4)],
             ['yt_id(4)', 'yt_title(4)', (A2, B3)],
             ['yt_id(5)', 'yt_title(5)', (A2, B2)]]
+        - separation_decision (dict): return_decision일 때만. 반주 없는 녹음이라 분리를 생략했는지 ('separated'),
+            판단 특징 / 소요 시간, 생략으로 아낀 추정 시간 ('saved_sec'). AudioProcessor.check_separation 참조.
     """
     key_calculator, faiss_index, sbert = obj
 
     user_voice_processor = AudioProcessor(youtube_url=None, save_dir=save_dir, original_wav_path=wav_path)
     similar_sets, user_pitch_ = user_voice_processor.vocal_base_searching(faiss_index)
     user_range_ = VocalRange(user_pitch_[0], user_pitch_[1])
+    if return_decision:
+        return similar_sets, user_range_, user_voice_processor.separation_decision
     return similar_sets, user_range_
 
 
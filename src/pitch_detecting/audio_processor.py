@@ -1,30 +1,60 @@
 # <src/pitch_detecting/audio_processor.py>
 
 import os
-import shlex
+import copy
+import time
+import contextlib
 import librosa
-import crepe
 import numpy as np
+import soundfile as sf
 import logging
 import shutil
 from yt_dlp import YoutubeDL
-import demucs.separate
 import torch
-import tensorflow as tf
 from src.pitch_detecting.vocal_range import VocalRange
 from src.pitch_detecting.embedding_utils import add_or_search_embedding
+from src.pitch_detecting.pitch_engines import get_pitch_engine
+from src.pitch_detecting.separator import get_separator, loaded_separator, analysis_plan, merge_ranges, \
+    separation_features, needs_separation, separator_config
+from src.pitch_detecting.stem_cache import get_stem_cache, StemCache, DEFAULT_STEM_CACHE_DIR
+from utils.audio import AudioContext
+from utils.decode import decode_audio
+from utils.vad import FrameEnergy
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class AudioProcessor:
-    def __init__(self, youtube_url, save_dir, original_wav_path=None):
+    def __init__(self, youtube_url, save_dir, original_wav_path=None, pitch_engine=None, pitch_decoder=None,
+                 separator=None, debug=False):
         
         self.yt_url = youtube_url                   # 'Youtube 다운받을 링크
         self.data_file_path = save_dir              # ./data
-        self.origin_wav_path = original_wav_path    # 분리 전 원곡 .wav 파일 경로
+        self.origin_wav_path = original_wav_path    # 분리 전 원곡 파일 경로 (ffmpeg이 읽을 수 있는 형식: wav, flac, mp3, m4a, webm ...)
         self.vocal_wav_path = None                  # 분리된 vocal 음원 .wav 파일 경로
+        self.separator = separator                  # Separator 객체, 분리기 이름 또는 tier 이름 ('accurate', 'light', 'fast'). None이면 DEFAULT_SEPARATOR
+        self.debug = debug                          # True면 중간 파일 (다운로드한 원곡 / vocal .wav) 을 디스크에 남김
+
+        self.origin_audio = None                    # 메모리 상의 원곡 waveform (channels x samples)
+        self.origin_sr = None                       # origin_audio sampling rate
+        self.decode_sr = 44100                      # 원곡 decode rate (Demucs / DSP separator 입력 rate와 같으면 분리 전 resample 생략). None이면 파일 원래 rate
+        self.decode_channels = 2                    # 원곡 decode channel 수. None이면 파일 원래 channel 수
+        self.vocal_audio = None                     # 메모리 상의 분리된 vocal waveform (mono)
+        self.vocal_sr = None                        # vocal_audio sampling rate
+        self.vocal_context = None                   # vocal의 AudioContext (pitch / timbre가 공유하는 decode + rate 별 resample). audio_context() 참조
+        self.analysis_plan = None                   # 분리할 구간. None: 전체, 'auto': 전후 trim_duration 안쪽 (num_excerpts 참조), 또는 [(start_sec, end_sec), ...]
+        self.num_excerpts = None                    # 'auto' plan에서 분리할 excerpt 수. None이면 trim 안쪽 전체 한 구간
+        self.excerpt_duration = 30.0                # 'auto' plan excerpt 길이 (sec)
+        self.separation_context = None              # 분리 구간 앞뒤로 추가 분리 후 버리는 문맥 길이 (sec). None이면 Demucs segment 길이
+        self.vocal_ranges = None                    # 실제로 분리된 구간 (sec). None이면 전체
+        self.separation_workers = None              # 지정 시 전체 분리를 chunk로 나눠 이 수만큼 동시에 분리 (DemucsSeparator.separate_chunked)
+        self.separation_rss_mb = None               # chunk 병렬 분리 시 프로세스 RSS 상한 (MB). None이면 제한 X
+        self.skip_clean_separation = True           # 'user' mode에서 반주 없는 목소리 녹음이면 분리 생략
+        self.skip_separation_thresholds = None      # needs_separation 임계값 (None이면 SKIP_SEPARATION_THRESHOLDS)
+        self.separation_decision = None             # 분리 생략 판단 결과 (check_separation 참조). 판단하지 않았으면 None
+        self.stem_cache = False                     # opt-in. StemCache 객체 또는 True (공유 cache: NORAEHE_STEM_CACHE_DIR, 없으면 ./data/stem_cache). False면 디스크에 쓰지 않음
+        self.stem_cache_hit = None                  # 마지막 separate_vocals가 stem cache에서 vocal을 가져왔는지
 
         self.yt_title = None                        # Youtube 제목
         self.yt_id = None                           # Youtube 링크 ID
@@ -33,6 +63,13 @@ class AudioProcessor:
         self.sr = None                              # Sampling rate
         self.time = None                            # time array
         self.frequency = None                       # 시간 당 frequency 값
+        self.energy = None                          # FrameEnergy (frame RMS, 트랙 당 한 번 계산)
+        self.pitch_engine = pitch_engine            # PitchEngine 객체, 엔진 이름 또는 tier 이름 (None이면 DEFAULT_PITCH_ENGINE)
+        self.pitch_decoder = pitch_decoder          # CREPE activation 디코딩 방식 ('viterbi', 'banded_viterbi', 'local', 'median'). None이면 엔진 기본값
+        self.gate_before_pitch = True               # RMS gating / trimming을 pitch 추정 전에 적용 (살아남는 frame만 엔진에 넣음)
+        self.pitch_frame_counts = None              # (전체 pitch frame 수, 실제 분석한 frame 수)
+        self.chunk_duration = None                  # pitch 추정 chunk 길이 (sec). None이면 전체 신호를 한 번에 처리
+        self.chunk_overlap = 1.0                    # chunk 경계 앞뒤로 추가 분석할 길이 (sec, Viterbi 문맥 용)
 
         self.frame_length = 2048                    # hyperparam1 for pitch detecting
         self.hop_length = 512                       # hyperparam2 for pitch detecting
@@ -41,56 +78,315 @@ class AudioProcessor:
         self.to_deletes = []                        # 지울 dir 목록
 
     def download_audio(self):
+        # 압축된 원본 (webm / m4a) 그대로 받아 ffmpeg pipe로 바로 decode (wav 변환 파일 없음)
         ydl_opts = {
             'format': 'bestaudio/best',
             'outtmpl': os.path.join(self.data_file_path, '%(id)s.%(ext)s'),
             'quiet': True,
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'wav',
-            }],
         }
         with YoutubeDL(ydl_opts) as ydl:
             info_dict = ydl.extract_info(self.yt_url, download=True)
             self.yt_title = info_dict.get('title', None)
             self.yt_id = info_dict.get('id', None)
-            self.origin_wav_path = os.path.join(self.data_file_path, f"{self.yt_id}.wav")
-            logger.info(f"Downloaded youtube to .wav: {self.yt_title}, {self.yt_url}")           
+            self.origin_wav_path = ydl.prepare_filename(info_dict)
+            logger.info(f"Downloaded youtube audio ({info_dict.get('ext')}): {self.yt_title}, {self.yt_url}")
+        # 이후 단계는 메모리 상의 waveform만 사용. debug가 아니면 다운로드 파일은 바로 삭제
+        self.origin_audio, self.origin_sr = self.read_audio(self.origin_wav_path)
+        if not self.debug:
+            os.remove(self.origin_wav_path)
+
+    def read_audio(self, path, offset=0.0, duration=None):
+        """
+        path (ffmpeg이 읽을 수 있는 모든 형식) 를 ffmpeg pipe로 decode_sr / decode_channels에 맞춰 바로 decode.
+        ffmpeg이 없으면 soundfile이 읽는 형식 (wav, flac, ogg) 만 가능 (utils.decode.decode_audio 참고).
+        output: (channels x samples float32 waveform, sampling rate)
+        """
+        return decode_audio(path, sr=self.decode_sr, channels=self.decode_channels, offset=offset, duration=duration)
 
-    def separate_vocals(self, mode='yt'):
+    def separate_vocals(self, mode='yt', separator=None):
         """
-        origin_wav_path와 Demucs를 이용해, Vocal 분리 및 vocal_wav_path 경로 값 채움.
+        원곡 waveform (origin_audio, 없으면 origin_wav_path) 과 Separator (프로세스 당 한 번 로드, 기본 htdemucs) 를 이용해
+        Vocal 분리 후 vocal_audio / vocal_sr 채움 (mono, 메모리 상에서만 전달).
+        analysis_plan이 있으면 그 구간만 분리 (구간 밖 vocal_audio는 0, pitch 추정에서는 RMS gating으로 빠짐).
+        없고 separation_workers가 있으면 chunk 병렬 분리.
+        'user' mode에서 skip_clean_separation이면 먼저 check_separation()으로 판단해, 반주 없는 녹음은 분리 없이 원본을 vocal로 사용.
+        stem_cache를 켜면 분리 전 stem cache (원곡 content hash + 분리기 설정 + 분리 방식) 를 먼저 확인하고, 분리 결과는 cache에 저장.
+        debug면 vocal stem을 기존 CLI 출력과 같은 경로 / 형식으로 vocal_wav_path에 저장.
         input:
             mode (str): 'yt'라면 origin은 yt 인것. 'user'라면 user 목소리인것.
+            separator: 이번 호출에만 쓸 분리기 (Separator 객체, 분리기 이름 또는 tier 이름). None이면 self.separator.
         """
         assert mode in ['yt', 'user'], "Incorrect mode. while .separate_vocal()"
-        super_file_name = 'yt' if mode == 'yt' else 'user'
-        output_dir = os.path.join(self.data_file_path, super_file_name)
-        command = f'--two-stems vocals -n htdemucs -o {output_dir} "{self.origin_wav_path}"'
-        demucs.separate.main(shlex.split(command))
-        logger.info(f"Separated vocals from {self.origin_wav_path}")
-        # 보컬 wav 경로 설정
-        sub_file_name = self.yt_id if mode == 'yt' else os.path.splitext(os.path.basename(self.origin_wav_path))[0]
-        self.vocal_wav_path = os.path.join(self.data_file_path, f"{super_file_name}/htdemucs/{sub_file_name}/vocals.wav")
-
-        self.to_deletes.append(output_dir)
-
-    def detect_pitch_range(self):
-        self.audio, self.sr = librosa.load(self.vocal_wav_path, sr=self.sr)
-        self.time, self.frequency, confidence, activation = crepe.predict(self.audio, self.sr, viterbi=True)
-        # Calculate RMS energy
-        rms = librosa.feature.rms(y=self.audio.astype(float), frame_length=self.frame_length, hop_length=self.hop_length)[0]
-        rms_time = librosa.frames_to_time(np.arange(len(rms)), sr=self.sr, hop_length=self.hop_length)
+        separator = separator or self.separator
+        if self.origin_audio is None:
+            self.origin_audio, self.origin_sr = self.read_audio(self.origin_wav_path)
+        if mode == 'user' and self.skip_clean_separation and not self.check_separation(separator):
+            self.vocal_audio, self.vocal_sr = self.origin_audio.mean(axis=0), self.origin_sr
+            self.vocal_context = None
+            self.vocal_ranges, self.vocal_wav_path = None, self.origin_wav_path
+            self.origin_audio = None
+            return
+
+        self.vocal_ranges = self.plan_separation(self.origin_audio.shape[-1] / self.origin_sr)
+        config = separator_config(separator)
+        cache = self.get_stem_cache()
+        if cache:
+            key = cache.key(StemCache.audio_hash(self.origin_audio, self.origin_sr), config, self.separation_method())
+            cached = cache.get(key)
+        self.stem_cache_hit = bool(cache) and cached is not None
+        if self.stem_cache_hit:
+            (self.vocal_audio, self.vocal_sr), vocals = cached, None
+            logger.info(f"Loaded cached vocals for {self.yt_id or self.origin_wav_path}")
+        else:
+            vocals, self.vocal_sr = self.run_separator(get_separator(separator))
+            self.vocal_audio = vocals.mean(0).numpy()
+            if cache:
+                cache.put(key, self.vocal_audio, self.vocal_sr)
+        self.vocal_context = None
+        self.origin_audio = None  # 분리 후에는 원곡 waveform 불필요
+
+        if self.debug:
+            # 보컬 wav 경로 설정
+            super_file_name = 'yt' if mode == 'yt' else 'user'
+            output_dir = os.path.join(self.data_file_path, super_file_name)
+            sub_file_name = self.yt_id if mode == 'yt' else os.path.splitext(os.path.basename(self.origin_wav_path))[0]
+            self.vocal_wav_path = os.path.join(output_dir, config[1].get('model_name', config[0]), sub_file_name, 'vocals.wav')
+            os.makedirs(os.path.dirname(self.vocal_wav_path), exist_ok=True)
+            if vocals is None:
+                sf.write(self.vocal_wav_path, self.vocal_audio, self.vocal_sr, subtype='PCM_16')
+            else:
+                get_separator(separator).save(vocals, self.vocal_wav_path)
+
+    def run_separator(self, separator):
+        """vocal_ranges / separation_workers에 따라 분리 실행. output: (vocals (channels x samples tensor), sampling rate)"""
+        if self.vocal_ranges is None and self.separation_workers:
+            vocals = separator.separate_chunked(self.origin_audio, self.origin_sr, num_workers=self.separation_workers,
+                                                max_rss_mb=self.separation_rss_mb)
+        elif self.vocal_ranges is None:
+            vocals = separator.separate(self.origin_audio, self.origin_sr)
+        else:
+            vocals = separator.separate_ranges(self.origin_audio, self.origin_sr, self.vocal_ranges,
+                                               context=self.separation_context)
+        logger.info(f"Separated vocals from {self.yt_id or self.origin_wav_path} ({separator.last_call_sec:.2f}s)")
+        return vocals, separator.samplerate
+
+    def separation_method(self):
+        """stem cache key 용 분리 방식 (전체 / 구간 + 문맥 / chunk 병렬)."""
+        if self.vocal_ranges is not None:
+            return {'ranges': [list(r) for r in self.vocal_ranges], 'context': self.separation_context}
+        if self.separation_workers:
+            return {'chunked': True}
+        return 'full'
+
+    def get_stem_cache(self):
+        """사용할 StemCache. stem_cache가 False (기본값) 면 None."""
+        if not self.stem_cache:
+            return None
+        if self.stem_cache is True:
+            return get_stem_cache(DEFAULT_STEM_CACHE_DIR or os.path.join(self.data_file_path, 'stem_cache'))
+        return self.stem_cache
+
+    def check_separation(self, separator=None):
+        """
+        origin_audio에 반주가 있는지 STFT 한 번 (separation_features) 으로 판단해 separation_decision에 기록.
+        separation_decision: 'separated' (분리 여부), 'features', 'analysis_sec' (판단 소요 시간),
+            'saved_sec' (분리 생략으로 아낀 추정 시간 = 분리기 평균 처리 속도 x 길이 - 판단 시간. 분리기를 아직 안 썼으면 None).
+        output:
+            - 분리가 필요하면 True
+        """
+        start = time.perf_counter()
+        features = separation_features(self.origin_audio, self.origin_sr)
+        separate = needs_separation(features, self.skip_separation_thresholds)
+        analysis_sec = time.perf_counter() - start
+
+        saved_sec = None
+        instance = loaded_separator(separator)
+        rate = instance.latency_report()['sec_per_audio_sec'] if instance else None
+        if not separate and rate is not None:
+            saved_sec = rate * self.origin_audio.shape[-1] / self.origin_sr - analysis_sec
+        self.separation_decision = {'separated': separate, 'features': features, 'analysis_sec': analysis_sec,
+                                    'saved_sec': saved_sec}
+        logger.info(f"Separation {'needed' if separate else 'skipped'} for {self.yt_id or self.origin_wav_path}: "
+                    f"{features} ({analysis_sec:.2f}s)")
+        return separate
+
+    def plan_separation(self, duration):
+        """analysis_plan을 (start_sec, end_sec) 목록으로 변환. 전체 분리면 None."""
+        if self.analysis_plan is None:
+            return None
+        if self.analysis_plan == 'auto':
+            return analysis_plan(duration, self.trim_duration, self.num_excerpts, self.excerpt_duration)
+        return list(self.analysis_plan)
+
+    def audio_context(self):
+        """
+        vocal (vocal_audio, 없으면 vocal_wav_path를 한 번 decode) 의 AudioContext. 처음 호출 시 생성.
+        pitch 추정 / timbre encoder가 같은 객체에서 필요한 rate의 view를 받으므로 track 당 decode 한 번, rate 당 resample 한 번.
+        """
+        if self.vocal_context is None:
+            self.vocal_context = AudioContext(self.vocal_audio, self.vocal_sr) if self.vocal_audio is not None \
+                else AudioContext.from_file(self.vocal_wav_path)
+        return self.vocal_context
+
+    def vocal_source(self):
+        """
+        timbre encoder 입력: vocal의 AudioContext.
+        구간만 분리했으면 분리된 구간만 이어 붙여 넘김 (0 구간이 timbre window에 들어가지 않도록).
+        """
+        context = self.audio_context()
+        if self.vocal_ranges is None:
+            return context
+        return context.excerpts(merge_ranges(self.vocal_ranges))
+
+    def detect_pitch_range(self, engine=None, decoder=None):
+        """
+        vocal (vocal_audio, 없으면 vocal_wav_path) 의 음역대 추정.
+        input:
+            engine: 이번 호출에만 쓸 pitch engine (PitchEngine 객체, 엔진 이름 또는 tier 이름). None이면 self.pitch_engine.
+            decoder (str): 이번 호출에만 쓸 CREPE 디코딩 방식. None이면 self.pitch_decoder.
+        output:
+            note_range (tuple): (최저음, 최고음) note name
+        """
+        engine = self.get_pitch_engine(engine, decoder)
+        if self.chunk_duration:
+            return self.detect_pitch_range_chunked(engine)
+        frame_filter = self.load_vocal()
+        self.time, self.frequency, confidence = engine.predict(*self.engine_audio(engine), frame_filter=frame_filter)
+        return self.pitch_result(engine)
+
+    def get_pitch_engine(self, engine=None, decoder=None):
+        """호출 인자 > 객체 설정 > DEFAULT_PITCH_ENGINE 순으로 PitchEngine 결정."""
+        decoder = decoder or self.pitch_decoder
+        return get_pitch_engine(engine or self.pitch_engine, **({'decoder': decoder} if decoder else {}))
+
+    def load_vocal(self):
+        """
+        audio_context() 에서 self.sr (None이면 native rate) view를 받아 FrameEnergy 계산.
+        pitch engine에 넘길 frame_filter 반환 (gate_before_pitch=False면 None).
+        """
+        context = self.audio_context()
+        self.sr = self.sr or context.sr
+        self.audio = context.resampled(self.sr)
+        # Calculate RMS energy (트랙 당 한 번 계산해 self.energy로 공유)
+        self.energy = FrameEnergy(self.audio, self.sr)
+        return self.pitch_frame_mask if self.gate_before_pitch else None
 
+    def engine_audio(self, engine):
+        """
+        pitch engine 입력 (audio, sr). 엔진이 고정 입력 rate (engine.sample_rate) 를 쓰면 audio_context()의 그 rate view를 넘겨
+        엔진 내부 resample을 생략 (CREPE 16 kHz view는 timbre encoder와 공유). frame 시간은 sec 단위라 RMS gating에는 영향 X.
+        """
+        if engine.sample_rate is None or engine.sample_rate == self.sr:
+            return self.audio, self.sr
+        return self.audio_context().resampled(engine.sample_rate), engine.sample_rate
+
+    def pitch_result(self, engine):
+        """self.time / self.frequency 로 frame 수 기록 후 음역대 계산."""
+        num_analysed = int(np.count_nonzero(self.pitch_frame_mask(self.time))) if self.gate_before_pitch else len(self.time)
+        self.pitch_frame_counts = (len(self.time), num_analysed)
+        logger.info(f"Pitch tracked with {engine.name}: {num_analysed} / {len(self.time)} frames analysed")
+        return self.pitch_to_note_range(self.time, self.frequency)
+
+    def detect_pitch_range_chunked(self, engine):
+        """
+        vocal (vocal_audio, 없으면 vocal_wav_path) 을 chunk_duration 단위로 읽어 pitch 추정. chunk 마다 RMS gating / trimming을 통과한 frequency만 누적하므로
+        peak 메모리는 곡 길이와 무관 (self.audio / self.time / self.frequency는 채우지 않음).
+        chunk 앞뒤 chunk_overlap 만큼은 추가로 분석해 Viterbi 문맥으로만 쓰고 버림.
+        chunk 경계는 RMS hop / 10 ms pitch frame / resampling 격자에 맞춰, 경계 안쪽 frame은 전체 처리와 같은 위치에서 계산됨.
+        엔진이 고정 입력 rate (engine.sample_rate, CREPE 16 kHz) 를 쓰면 전체 처리 (engine_audio) 와 같이 그 rate의 audio를 chunk 별로 잘라 넘김.
+        """
+        with self.open_vocal() as (native_sr, native_frames, read):
+            self.sr = self.sr or native_sr
+            engine_sr = engine.sample_rate or self.sr
+            num_samples = int(np.ceil(native_frames * self.sr / native_sr))
+            align = int(np.lcm.reduce([self.hop_length, self.sr // np.gcd(self.sr, 100),
+                                       self.sr // np.gcd(self.sr, native_sr), self.sr // np.gcd(self.sr, engine_sr)]))
+            chunk = max(1, round(self.chunk_duration * self.sr / align)) * align
+            overlap = int(self.chunk_overlap * self.sr)
+            # 읽기 margin: overlap + pitch / RMS frame 반경 (0.1 sec) 이상
+            margin = int(np.ceil((self.chunk_overlap + 0.1) * self.sr / align)) * align
+            # 전체 처리의 마지막 frame: engine_sr view 길이 (librosa resample 출력 길이, ceil) 기준
+            last_time = engine.last_frame_time(int(np.ceil(native_frames * engine_sr / native_sr)), engine_sr)
+
+            valid_frequencies, num_frames, num_analysed = [], 0, 0
+            for start in range(0, num_samples, chunk):
+                read_start, read_end = max(0, start - margin), min(num_samples, start + chunk + margin)
+                audio = read(read_start, read_end, self.sr)
+                self.energy = FrameEnergy(audio, self.sr, offset=read_start)
+
+                offset_sec = read_start / self.sr
+                analysed_range = (start - overlap, start + chunk + overlap)
+                frame_filter = lambda t: self.pitch_frame_mask(t + offset_sec, last_time, analysed_range)
+                if engine_sr != self.sr:
+                    # read_start는 engine_sr 격자에도 맞춰져 있어 chunk의 frame 위치가 전체 처리와 같음
+                    audio = read(read_start * engine_sr // self.sr, -(-read_end * engine_sr // self.sr), engine_sr)
+                time, frequency, _ = engine.predict(audio, engine_sr, frame_filter=frame_filter)
+
+                # 이 chunk 몫 (overlap 제외) 의 frame만 누적
+                time = time + offset_sec
+                position = np.round(time * self.sr)
+                own = (position >= start) & (position < start + chunk)
+                keep = own & self.pitch_frame_mask(time, last_time)
+                num_frames += int(np.count_nonzero(own))
+                num_analysed += int(np.count_nonzero(keep))
+                valid_frequencies.append(frequency[keep & ~np.isnan(frequency)])
+
+        self.audio, self.time, self.frequency, self.energy = None, None, None, None
+        self.pitch_frame_counts = (num_frames, num_analysed)
+        logger.info(f"Pitch tracked with {engine.name} in {chunk / self.sr:.1f}s chunks: "
+                    f"{num_analysed} / {num_frames} frames analysed")
+        return self.note_range_from_frequencies(np.concatenate(valid_frequencies))
+
+    @contextlib.contextmanager
+    def open_vocal(self):
+        """
+        chunk 단위 읽기 용. (native sampling rate, native sample 수, read(start, end, sr) -> mono float32) 을 yield.
+        read는 sr 기준 [start, end) sample 구간을 sr로 반환 (start는 native rate 격자에 맞춰져 있어야 함).
+        vocal_audio가 있으면 audio_context()의 sr view를 slice (chunk 별 resample 없음, 전체 처리와 같은 sample),
+        없으면 vocal_wav_path를 SoundFile로 열어 필요한 구간만 읽고 librosa로 resample.
+        """
+        if self.vocal_audio is not None:
+            context = self.audio_context()
+            yield context.sr, len(context.wav), lambda start, end, sr: context.resampled(sr)[start:end]
+            return
+        with sf.SoundFile(self.vocal_wav_path) as f:
+            def read(start, end, sr):
+                f.seek(start * f.samplerate // sr)
+                audio = f.read(-(-(end - start) * f.samplerate // sr), dtype='float32', always_2d=True).mean(axis=1)
+                if sr != f.samplerate:
+                    audio = librosa.resample(audio, orig_sr=f.samplerate, target_sr=sr)[:end - start]
+                return audio
+            yield f.samplerate, f.frames, read
+
+    def pitch_frame_mask(self, time, last_time=None, sample_range=None):
+        """
+        pitch_to_note_range에서 살아남는 frame (RMS >= rms_threshold, 전후 trim_duration 밖) 만 True.
+        last_time: 전체 신호의 마지막 frame 시간 (None이면 time[-1]). sample_range: (start, end) sample 밖의 frame은 제외.
+        """
+        time = np.asarray(time)
+        last_time = time[-1] if last_time is None else last_time
+        rms_values_at_pitch_times = self.energy.rms_at(time, self.frame_length, self.hop_length)
+        mask = (rms_values_at_pitch_times >= self.rms_threshold) \
+            & (time >= self.trim_duration) & (time <= (last_time - self.trim_duration))
+        if sample_range is not None:
+            position = np.round(time * self.sr)
+            mask &= (position >= sample_range[0]) & (position < sample_range[1])
+        return mask
+
+    def pitch_to_note_range(self, time, frequency):
+        """
+        pitch engine 출력 (time, frequency) 에 RMS gating / 전후 trimming / percentile-IQR outlier 제거를 적용해 음역대 계산.
+        모든 pitch engine이 같은 범위 계산을 공유. 무성음 frame은 frequency NaN. self.energy (FrameEnergy) 필요.
+        """
         # Interpolate RMS values at pitch times
-        rms_values_at_pitch_times = np.interp(self.time, rms_time, rms)
+        rms_values_at_pitch_times = self.energy.rms_at(time, self.frame_length, self.hop_length)
 
         # Filter out frequencies where RMS is below threshold
-        frequency_array = np.array(self.frequency)
+        frequency_array = np.array(frequency, dtype=float)
         frequency_array[rms_values_at_pitch_times < self.rms_threshold] = np.nan
 
         # Convert time to NumPy array for efficient indexing
-        time_array = np.array(self.time)
+        time_array = np.array(time)
 
         # Trim the first and last `trim_duration` seconds
         valid_indices = (time_array >= self.trim_duration) & (time_array <= (time_array[-1] - self.trim_duration))
@@ -98,6 +394,12 @@ class AudioProcessor:
 
         # Remove NaN values for percentile calculations
         valid_frequencies = frequency_array[~np.isnan(frequency_array)]
+        return self.note_range_from_frequencies(valid_frequencies)
+
+    def note_range_from_frequencies(self, valid_frequencies):
+        """
+        RMS gating / trimming 후 남은 (NaN 제외) frequency에 percentile-IQR outlier 제거 후 (최저음, 최고음) 계산.
+        """
         if len(valid_frequencies) == 0:
             raise ValueError("No valid frequency data after applying RMS threshold and trimming.")
 
@@ -109,7 +411,7 @@ class AudioProcessor:
         lower_bound, upper_bound = Q1 - 1.5 * IQR, Q3 + 1.5 * IQR
 
         # Remove outliers
-        frequency_array = np.where((frequency_array >= lower_bound) & (frequency_array <= upper_bound), frequency_array, np.nan)
+        frequency_array = np.where((valid_frequencies >= lower_bound) & (valid_frequencies <= upper_bound), valid_frequencies, np.nan)
 
         # 주파수를 MIDI 음계로 변환
         midi_values = 69 + 12 * np.log2(frequency_array / 440.0)
@@ -126,7 +428,9 @@ class AudioProcessor:
         return note_range
 
     def cleanup_files(self, remove_org_wav=True):
-        if remove_org_wav and os.path.exists(self.origin_wav_path):
+        if self.debug:
+            return
+        if remove_org_wav and self.origin_wav_path and os.path.exists(self.origin_wav_path):
             os.remove(self.origin_wav_path)
             logger.info(f"Deleted: {self.origin_wav_path}")
         for dir_path in self.to_deletes:
@@ -139,7 +443,7 @@ class AudioProcessor:
             self.download_audio()
             self.separate_vocals()
             range = self.detect_pitch_range()
-            add_or_search_embedding(faiss, self.vocal_wav_path, sbert, self.yt_id, self.yt_title, range)
+            add_or_search_embedding(faiss, self.vocal_source(), sbert, self.yt_id, self.yt_title, range)
             return range
         
         except Exception as e:
@@ -153,7 +457,7 @@ class AudioProcessor:
         try:
             self.separate_vocals(mode='user')
             range = self.detect_pitch_range()
-            similar_sets = add_or_search_embedding(faiss, self.vocal_wav_path)
+            similar_sets = add_or_search_embedding(faiss, self.vocal_source())
             return similar_sets, range
         
         except Exception as e:
@@ -161,3 +465,40 @@ class AudioProcessor:
 
         finally:
             self.cleanup_files(remove_org_wav=False)
+
+
+def detect_pitch_ranges(processors, engine=None, decoder=None, batch_size=None):
+    """
+    vocal (vocal_audio 또는 vocal_wav_path) 이 준비된 여러 AudioProcessor의 음역대를 한 번에 추정 (bulk catalog build 용).
+    CREPE는 모든 곡의 분석 frame을 모아 큰 batch로 실행한 뒤 곡 별로 나눔. chunk_duration은 사용하지 않음.
+    input:
+        - processors (list of AudioProcessor)
+        - engine, decoder: 미지정 시 첫 번째 processor 설정을 따름.
+        - batch_size (int): CREPE model.predict batch 크기. None이면 엔진 설정 (CREPE 외 엔진에는 무시).
+    output:
+        - note_ranges (list): 곡 별 (최저음, 최고음). 실패한 곡은 None.
+    """
+    if not processors:
+        return []
+    engine = processors[0].get_pitch_engine(engine, decoder)
+    if batch_size and getattr(engine, 'batch_size', batch_size) != batch_size:
+        engine = copy.copy(engine)  # 공유 엔진 객체의 설정은 바꾸지 않음
+        engine.batch_size = batch_size
+    loaded, items = [], []
+    for processor in processors:
+        try:
+            frame_filter = processor.load_vocal()
+        except Exception as e:
+            logging.error(f"Error occurred while loading {processor.yt_id or processor.vocal_wav_path} in detect_pitch_ranges(): {e}")
+            continue
+        loaded.append(processor)
+        items.append((*processor.engine_audio(engine), frame_filter))
+
+    note_ranges = {}
+    for processor, (time, frequency, confidence) in zip(loaded, engine.predict_batch(items)):
+        processor.time, processor.frequency = time, frequency
+        try:
+            note_ranges[id(processor)] = processor.pitch_result(engine)
+        except ValueError as e:
+            logging.error(f"Error occurred while detecting pitch range of {processor.yt_id or processor.vocal_wav_path}: {e}")
+    return [note_ranges.get(id(processor)) for processor in processors]
@@ -0,0 +1,150 @@
+# <src/pitch_detecting/crepe_export.py>
+
+import os
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('tensorflow', 'onnx', 'tflite')
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pretrained_crepe')
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def crepe_weight_path(capacity):
+    """crepe 패키지에 포함된 Keras weight 파일 경로 (export staleness 기준)."""
+    import crepe.core
+
+    return os.path.join(os.path.dirname(crepe.core.__file__), f'model-{capacity}.h5')
+
+
+def export_crepe_onnx(capacity, path, opset_version=17):
+    """
+    CREPE Keras model을 ONNX로 저장 (tensorflow / tf2onnx 필요, export 시 한 번만).
+    입력 'input' (batch x 1024), 출력 'classifier' (batch x 360). batch 축만 dynamic.
+    """
+    import tensorflow as tf
+    import tf2onnx
+    from crepe.core import build_and_load_model
+
+    model = build_and_load_model(capacity)
+    signature = (tf.TensorSpec((None, 1024), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=opset_version, output_path=path)
+    logger.info(f"Exported CREPE ({capacity}) to ONNX: {path}")
+    return path
+
+
+def export_crepe_tflite(capacity, path):
+    """
+    CREPE Keras model을 TFLite로 저장 (tensorflow 필요, export 시 한 번만). batch 축은 실행 시 resize.
+    """
+    import tensorflow as tf
+    from crepe.core import build_and_load_model
+
+    model = build_and_load_model(capacity)
+    with open(path, 'wb') as f:
+        f.write(tf.lite.TFLiteConverter.from_keras_model(model).convert())
+    logger.info(f"Exported CREPE ({capacity}) to TFLite: {path}")
+    return path
+
+
+class OnnxCrepeModel:
+    """
+    ONNX Runtime (CPU) 로 export된 CREPE 실행. Keras model.predict와 같은 호출 형태.
+    input:
+        - path (str): export_crepe_onnx()로 저장한 .onnx 파일 경로.
+        - num_threads (int): intra-op thread 수. None이면 onnxruntime 기본값.
+    """
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+
+    def predict(self, frames, batch_size=32, verbose=0):
+        """
+        frames (np.ndarray): N x 1024 -> activation (np.ndarray): N x 360
+        """
+        frames = np.ascontiguousarray(frames, dtype=np.float32)
+        return np.concatenate([self.session.run(['classifier'], {'input': frames[i:i + batch_size]})[0]
+                               for i in range(0, len(frames), batch_size)])
+
+
+class TFLiteCrepeModel:
+    """
+    TFLite interpreter (ai_edge_litert, 없으면 tflite_runtime) 로 export된 CREPE 실행. Keras model.predict와 같은 호출 형태.
+    input:
+        - path (str): export_crepe_tflite()로 저장한 .tflite 파일 경로.
+        - num_threads (int): interpreter thread 수.
+    """
+    def __init__(self, path, num_threads=None):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            from tflite_runtime.interpreter import Interpreter
+
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self.batch_size = None
+        self.lock = threading.Lock()  # interpreter는 thread-safe 하지 않음
+
+    def _run(self, frames):
+        if len(frames) != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input_index, [len(frames), 1024])
+            self.interpreter.allocate_tensors()
+            self.batch_size = len(frames)
+        self.interpreter.set_tensor(self.input_index, frames)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index).copy()
+
+    def predict(self, frames, batch_size=32, verbose=0):
+        """
+        frames (np.ndarray): N x 1024 -> activation (np.ndarray): N x 360
+        """
+        frames = np.ascontiguousarray(frames, dtype=np.float32)
+        with self.lock:
+            return np.concatenate([self._run(frames[i:i + batch_size]) for i in range(0, len(frames), batch_size)])
+
+
+def _is_stale(path, capacity):
+    if not os.path.exists(path):
+        return True
+    try:
+        source_path = crepe_weight_path(capacity)
+    except ImportError:
+        return False
+    return os.path.exists(source_path) and os.path.getmtime(path) < os.path.getmtime(source_path)
+
+
+def load_crepe_model(capacity='full', backend='tensorflow', export_dir=None, num_threads=None):
+    """
+    (capacity, backend, export_dir, num_threads) 별로 프로세스 당 한 번 로드한 CREPE model 반환. 모두 predict(frames, batch_size, verbose) 지원.
+    onnx / tflite는 export_dir에 export 파일이 없으면 (또는 crepe weight보다 오래됐으면) 한 번 export 함 (이때만 tensorflow 필요).
+    input:
+        - capacity (str): 'tiny', 'small', 'medium', 'large', 'full'
+        - backend (str): 'tensorflow' (crepe 원본 Keras), 'onnx', 'tflite'
+        - export_dir (str): export 파일 경로. None이면 pitch_detecting/pretrained_crepe.
+        - num_threads (int): onnx / tflite 실행 thread 수. None이면 실행기 기본값.
+    """
+    assert backend in BACKENDS, f"Unknown CREPE backend: {backend}"
+    if backend == 'tensorflow':
+        from crepe.core import build_and_load_model
+
+        return build_and_load_model(capacity)
+
+    export_dir = os.path.abspath(export_dir or EXPORT_DIR)
+    key = (capacity, backend, export_dir, num_threads)
+    with _models_lock:
+        if key not in _models:
+            os.makedirs(export_dir, exist_ok=True)
+            path = os.path.join(export_dir, f'crepe_{capacity}.{backend}')
+            if _is_stale(path, capacity):
+                (export_crepe_onnx if backend == 'onnx' else export_crepe_tflite)(capacity, path)
+            _models[key] = (OnnxCrepeModel if backend == 'onnx' else TFLiteCrepeModel)(path, num_threads=num_threads)
+        return _models[key]
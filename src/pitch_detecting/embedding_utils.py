@@ -2,8 +2,10 @@
 
 from src.timbre_encoding.timbre_encoder import timbre_enc
 
-def add_or_search_embedding(faiss_index, vocal_wav_path, sbert_model=None, yt_id=None, yt_title=None, range_=None):
-    embedding = timbre_enc(vocal_wav_path)
+def add_or_search_embedding(faiss_index, vocal_wav_path, sbert_model=None, yt_id=None, yt_title=None, range_=None, encoder=None):
+    # encoder 미지정 시 프로세스 공유 TimbreEncoder 사용 (checkpoint 재로드 X)
+    # vocal_wav_path는 파일 경로, 메모리 상의 (mono waveform, sampling rate) tuple 또는 AudioContext (AudioProcessor.vocal_source)
+    embedding = timbre_enc(vocal_wav_path, encoder=encoder)
      # yt_title 값 존재 시, faiss adding에 해당. None일 경우, Searching based on user voice.
     if yt_title and (yt_id not in [s[0] for s in faiss_index.sets]):
         title_embed = sbert_model.encode([yt_title], batch_size=1)
@@ -0,0 +1,127 @@
+# <src/pitch_detecting/pitch_decoders.py>
+
+import numpy as np
+
+# CREPE 출력 bin (360개, 20 cents 간격) -> cents. crepe.core.to_local_average_cents와 같은 mapping.
+N_BINS = 360
+CENTS_MAPPING = np.linspace(0, 7180, N_BINS) + 1997.3794084376191
+
+# crepe.core.to_viterbi_cents의 transition은 max(12 - |i - j|, 0) 이므로 |i - j| <= 11 밖은 확률 0.
+VITERBI_BAND = 11
+SELF_EMISSION = 0.1
+
+
+def local_average_cents(activation, center=None):
+    """
+    center bin (기본: frame 별 argmax) 주변 +-4 bin의 activation 가중 평균 cents. crepe.core.to_local_average_cents의 vectorized 버전.
+    input:
+        - activation (np.ndarray): frame 수 x 360
+        - center (np.ndarray): frame 별 중심 bin. None이면 argmax.
+    output:
+        - cents (np.ndarray): frame 별 cents
+    """
+    if center is None:
+        center = np.argmax(activation, axis=1)
+    # 양 끝 4 bin을 0으로 padding해 window를 항상 9 bin으로 맞춤 (padding bin은 가중치 0)
+    padded = np.pad(activation, ((0, 0), (4, 4)))
+    padded_cents = np.pad(CENTS_MAPPING, 4)
+    index = center[:, None] + np.arange(9)[None, :]
+    salience = np.take_along_axis(padded, index, axis=1)
+    return np.sum(salience * padded_cents[index], axis=1) / np.sum(salience, axis=1)
+
+
+def _banded_log_transition(band):
+    """
+    (360, 2 * band + 1) 배열. [j, k] 는 이전 state i = j + k - band 에서 state j 로 가는 log 확률 (범위 밖은 -inf).
+    """
+    offsets = np.arange(-band, band + 1)
+    weight = np.maximum(12 - np.abs(offsets), 0).astype(float)
+    prev = np.arange(N_BINS)[:, None] + offsets[None, :]
+    valid = (prev >= 0) & (prev < N_BINS) & (weight[None, :] > 0)
+    # 이전 state i 기준 행 정규화 (band 안의 transition 합)
+    row_sum = np.zeros(N_BINS)
+    np.add.at(row_sum, prev[valid], np.broadcast_to(weight, prev.shape)[valid])
+    log_transition = np.full(prev.shape, -np.inf)
+    log_transition[valid] = np.log(np.broadcast_to(weight, prev.shape)[valid] / row_sum[prev[valid]])
+    return log_transition
+
+
+def banded_viterbi_path(activation, band=VITERBI_BAND):
+    """
+    crepe.core.to_viterbi_cents와 같은 HMM (uniform start, max(12 - |i - j|, 0) transition, argmax 관측) 을
+    |i - j| <= band 인 transition만으로 디코딩. band=11 이면 hmmlearn 360x360 Viterbi와 같은 경로 (동점 경로 선택 포함), 더 작으면 근사.
+    input:
+        - activation (np.ndarray): frame 수 x 360
+        - band (int): transition window 반경 (bin)
+    output:
+        - path (np.ndarray): frame 별 Viterbi 경로 bin
+    """
+    n_frames = len(activation)
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.int64)
+    observations = np.argmax(activation, axis=1)
+    log_transition = _banded_log_transition(band)
+    # hmmlearn (_hmmc.viterbi) 과 같은 순서로 더해 같은 lattice 값을 얻고, 동점 처리도 hmmlearn과 맞춤:
+    # 마지막 state는 가장 작은 index, backtracking은 가장 큰 이전 index (std::max의 (값, index) pair 비교)
+    log_emission = np.full(N_BINS, np.log((1 - SELF_EMISSION) / N_BINS))
+    log_self = np.log(SELF_EMISSION + (1 - SELF_EMISSION) / N_BINS)
+
+    backpointer = np.empty((n_frames, N_BINS), dtype=np.int16)
+    delta = np.log(np.full(N_BINS, 1 / N_BINS)) + log_emission
+    delta[observations[0]] = np.log(1 / N_BINS) + log_self
+    padded = np.full(N_BINS + 2 * band, -np.inf)
+    for t in range(1, n_frames):
+        padded[band:band + N_BINS] = delta
+        scores = np.lib.stride_tricks.sliding_window_view(padded, 2 * band + 1) + log_transition
+        best = 2 * band - np.argmax(scores[:, ::-1], axis=1)
+        delta = scores[np.arange(N_BINS), best] + log_emission
+        delta[observations[t]] = scores[observations[t], best[observations[t]]] + log_self
+        backpointer[t] = best - band
+
+    path = np.empty(n_frames, dtype=np.int64)
+    path[-1] = np.argmax(delta)
+    for t in range(n_frames - 1, 0, -1):
+        path[t - 1] = path[t] + backpointer[t, path[t]]
+    return path
+
+
+def banded_viterbi_cents(activation, band=VITERBI_BAND):
+    """
+    banded_viterbi_path 경로 bin 중심 local average cents.
+    input:
+        - activation (np.ndarray): frame 수 x 360
+        - band (int): transition window 반경 (bin)
+    output:
+        - cents (np.ndarray): frame 별 cents
+    """
+    if len(activation) == 0:
+        return np.zeros(0)
+    return local_average_cents(activation, banded_viterbi_path(activation, band))
+
+
+def median_smoothed_cents(activation, kernel_size=5):
+    """
+    local_average_cents 결과에 kernel_size frame median filter (가장자리는 edge padding). 짧은 octave jump 제거용.
+    """
+    cents = local_average_cents(activation)
+    if len(cents) == 0 or kernel_size <= 1:
+        return cents
+    pad = kernel_size // 2
+    windows = np.lib.stride_tricks.sliding_window_view(np.pad(cents, pad, mode='edge'), 2 * pad + 1)
+    return np.median(windows, axis=1)
+
+
+def viterbi_cents(activation):
+    """crepe 원본 (hmmlearn 360-state) Viterbi 디코딩."""
+    from crepe.core import to_viterbi_cents
+
+    return to_viterbi_cents(activation)
+
+
+# CrepeEngine(decoder=...) 로 선택. 모두 activation (frame 수 x 360) -> cents.
+PITCH_DECODERS = {
+    'viterbi': viterbi_cents,
+    'banded_viterbi': banded_viterbi_cents,
+    'local': local_average_cents,
+    'median': median_smoothed_cents,
+}
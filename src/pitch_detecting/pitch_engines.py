@@ -0,0 +1,288 @@
+# <src/pitch_detecting/pitch_engines.py>
+
+import os
+import numpy as np
+import librosa
+from src.pitch_detecting.pitch_decoders import PITCH_DECODERS
+from src.pitch_detecting.crepe_export import load_crepe_model
+
+
+class PitchEngine:
+    """
+    Pitch tracking 엔진 공통 interface. 모든 엔진 출력은 AudioProcessor의 같은 percentile / IQR 범위 계산으로 들어감.
+
+    predict(audio, sr, frame_filter=None) output:
+        - time (np.ndarray): frame 별 시간 (sec)
+        - frequency (np.ndarray): frame 별 f0 (Hz). 무성음 frame과 frame_filter로 제외된 frame은 NaN.
+        - confidence (np.ndarray): frame 별 voicing confidence (0~1). 제외된 frame은 0.
+    frame_filter (callable): time (np.ndarray) -> bool mask. False인 frame은 분석에서 제외.
+    sample_rate: 엔진이 내부에서 resample 하는 고정 입력 rate. 지정되어 있으면 AudioProcessor가 이 rate의 view를 넘김. None이면 아무 rate.
+    """
+    name = None
+    sample_rate = None
+
+    def track(self, audio, sr):
+        """전체 신호의 (time, frequency, confidence)"""
+        raise NotImplementedError
+
+    def last_frame_time(self, num_samples, sr):
+        """길이 num_samples 신호 전체를 predict 했을 때 마지막 frame 시간 (sec). chunk 단위 처리의 trimming 기준."""
+        raise NotImplementedError
+
+    def predict(self, audio, sr, frame_filter=None):
+        # DSP 엔진은 전체를 추적한 뒤 mask만 적용 (frame 선택보다 전체 계산이 더 쌈)
+        time, frequency, confidence = self.track(audio, sr)
+        if frame_filter is not None:
+            keep = frame_filter(time)
+            frequency = np.where(keep, frequency, np.nan)
+            confidence = np.where(keep, confidence, 0.0)
+        return time, frequency, confidence
+
+    def predict_batch(self, items):
+        """
+        여러 곡의 (audio, sr, frame_filter) list -> 곡 별 predict() 결과 list. 기본은 곡 단위 순차 실행.
+        """
+        return [self.predict(audio, sr, frame_filter) for audio, sr, frame_filter in items]
+
+
+class CrepeEngine(PitchEngine):
+    """
+    CREPE. capacity가 작을수록 빠름 (tiny < small < medium < large < full).
+    decoder: activation -> pitch 디코딩 방식 (pitch_decoders.PITCH_DECODERS). None이면 viterbi 여부에 따라 'viterbi' / 'local'.
+    backend: model 실행기 ('tensorflow', 'onnx', 'tflite'). onnx / tflite는 tensorflow 없이 실행 (crepe_export 참고).
+        None이면 DEFAULT_CREPE_BACKEND.
+    max_batch_frames: predict_batch에서 run_model 한 번에 넣는 최대 frame 수 (frame 당 4 KB). 곡이 많아도 입력 메모리 상한 유지.
+    """
+    name = 'crepe'
+    CAPACITIES = ('tiny', 'small', 'medium', 'large', 'full')
+    SAMPLE_RATE = 16000                             # crepe.core.model_srate
+    sample_rate = SAMPLE_RATE
+
+    def __init__(self, capacity='full', viterbi=True, step_size=10, verbose=1, decoder=None, batch_size=32,
+                 backend=None, export_dir=None, num_threads=None, max_batch_frames=8192):
+        assert capacity in self.CAPACITIES, f"Unknown CREPE capacity: {capacity}"
+        decoder = decoder or ('viterbi' if viterbi else 'local')
+        assert decoder in PITCH_DECODERS, f"Unknown CREPE decoder: {decoder}"
+        self.capacity = capacity
+        self.decoder = decoder
+        self.step_size = step_size
+        self.verbose = verbose
+        self.batch_size = batch_size                # model.predict batch 크기 (crepe 기본 32)
+        self.backend = backend or DEFAULT_CREPE_BACKEND
+        self.export_dir = export_dir
+        self.num_threads = num_threads
+        self.max_batch_frames = max_batch_frames
+
+    def frames(self, audio, sr, frame_filter=None):
+        """
+        crepe.core.get_activation과 같은 resampling / framing / frame 정규화.
+        frame_filter(time) 이 False인 frame은 만들지 않음.
+        output:
+            - time (np.ndarray): 전체 frame 시간 (sec)
+            - frames (np.ndarray): 선택된 frame 수 x 1024 (정규화된 model 입력)
+            - index (np.ndarray): 선택된 frame index
+        """
+        from resampy import resample
+
+        audio = audio.astype(np.float32)
+        if sr != self.SAMPLE_RATE:
+            audio = resample(audio, sr, self.SAMPLE_RATE)
+        audio = np.pad(audio, 512, mode='constant', constant_values=0)
+
+        hop_length = int(self.SAMPLE_RATE * self.step_size / 1000)
+        n_frames = 1 + (len(audio) - 1024) // hop_length
+        time = np.arange(n_frames) * self.step_size / 1000.0
+        index = np.arange(n_frames) if frame_filter is None else np.flatnonzero(frame_filter(time))
+
+        frames = np.lib.stride_tricks.sliding_window_view(audio, 1024)[index * hop_length].copy()
+        frames -= np.mean(frames, axis=1)[:, np.newaxis]
+        frames /= np.clip(np.std(frames, axis=1)[:, np.newaxis], 1e-8, None)
+        return time, frames, index
+
+    def run_model(self, frames):
+        """frames (N x 1024) -> activation (N x 360)"""
+        if len(frames) == 0:
+            return np.zeros((0, 360), dtype=np.float32)
+        model = load_crepe_model(self.capacity, self.backend, self.export_dir, self.num_threads)
+        return model.predict(frames, batch_size=self.batch_size, verbose=self.verbose)
+
+    def activation(self, audio, sr, frame_filter=None):
+        """
+        frames() + run_model().
+        output:
+            - time (np.ndarray): 전체 frame 시간 (sec)
+            - activation (np.ndarray): 선택된 frame 수 x 360
+            - index (np.ndarray): 선택된 frame index
+        """
+        time, frames, index = self.frames(audio, sr, frame_filter)
+        return time, self.run_model(frames), index
+
+    def last_frame_time(self, num_samples, sr):
+        # 16 kHz 입력은 그대로, 그 외에는 frames()의 resampy 출력 길이 -> (512 padding 후) 1 + n // hop_length frames.
+        # AudioProcessor는 AudioContext의 16 kHz view (librosa resample, ceil 길이) 를 넘기므로 그 길이로 호출
+        num_resampled = int(num_samples * float(self.SAMPLE_RATE) / float(sr)) if sr != self.SAMPLE_RATE else num_samples
+        return (num_resampled // int(self.SAMPLE_RATE * self.step_size / 1000)) * self.step_size / 1000.0
+
+    def predict(self, audio, sr, frame_filter=None):
+        time, activation, index = self.activation(audio, sr, frame_filter)
+        frequency, confidence = self.decode(len(time), activation, index)
+        return time, frequency, confidence
+
+    def predict_batch(self, items):
+        """
+        여러 곡의 선택 frame을 모아 model.predict (batch_size 단위) 로 실행한 뒤 곡 별로 나눠 디코딩.
+        곡 마다 model.predict를 따로 부르는 overhead와 곡 끝의 작은 batch가 사라짐.
+        곡 경계와 상관없이 max_batch_frames 개씩 끊어 run_model을 부르므로 모델 입력은 max_batch_frames x 1024를 넘지 않음.
+        """
+        if not items:
+            return []
+        songs, pending, activations = [], [], []
+        num_pending = 0
+        for audio, sr, frame_filter in items:
+            time, frames, index = self.frames(audio, sr, frame_filter)
+            songs.append((time, index))
+            for start in range(0, len(frames), self.max_batch_frames):
+                part = frames[start:start + self.max_batch_frames]
+                if num_pending + len(part) > self.max_batch_frames:
+                    activations.append(self.run_model(np.concatenate(pending)))
+                    pending, num_pending = [], 0
+                pending.append(part)
+                num_pending += len(part)
+        activations.append(self.run_model(np.concatenate(pending) if pending else np.zeros((0, 1024), np.float32)))
+        activation = np.concatenate(activations)
+
+        counts = [len(index) for _, index in songs]
+        results = []
+        for (time, index), song_activation in zip(songs, np.split(activation, np.cumsum(counts)[:-1])):
+            results.append((time, *self.decode(len(time), song_activation, index)))
+        return results
+
+    def decode(self, n_frames, activation, index, decoder=None):
+        """
+        activation()의 출력을 frame 별 (frequency, confidence) 로 디코딩. 선택되지 않은 frame은 NaN / 0.
+        선택된 frame이 끊긴 곳마다 구간을 나눠 디코딩 (frame_filter 없으면 전체 한 구간 = crepe.predict와 동일).
+        frame_filter가 있으면 전체 track Viterbi와 동일하지 않음: 구간 경계에서 HMM 경로가 이어지지 않고 (각 구간은 uniform start),
+        빠진 frame의 activation이 없으므로 채워 넣을 값도 없음 (argmax 관측 HMM이라 uniform activation도 중립이 아님).
+        빠진 frame은 RMS gating에 걸린 무음 / trim 구간이라 구간 안쪽 경로는 거의 같음. note range 영향은 benchmark의 gated_decode 참고.
+        """
+        decode_cents = PITCH_DECODERS[decoder or self.decoder]
+        frequency = np.full(n_frames, np.nan)
+        confidence = np.zeros(n_frames)
+        if len(index) == 0:
+            return frequency, confidence
+
+        runs = np.split(np.arange(len(index)), np.flatnonzero(np.diff(index) != 1) + 1)
+        cents = np.concatenate([decode_cents(activation[run]) for run in runs])
+        selected = 10 * 2 ** (cents / 1200)
+        selected[np.isnan(selected)] = 0
+        frequency[index] = selected
+        confidence[index] = activation.max(axis=1)
+        return frequency, confidence
+
+
+class WorldEngine(PitchEngine):
+    """
+    pyworld DIO (빠름) / Harvest (느리지만 더 정확). utils.audio.AudioProcessor.compute_f0와 같은 DIO + StoneMask 방식.
+    """
+    name = 'world'
+    METHODS = ('dio', 'harvest')
+
+    def __init__(self, method='dio', f0_floor=50.0, f0_ceil=1100.0, frame_period=10.0):
+        assert method in self.METHODS, f"Unknown WORLD method: {method}"
+        self.method = method
+        self.f0_floor = f0_floor
+        self.f0_ceil = f0_ceil
+        self.frame_period = frame_period
+
+    def last_frame_time(self, num_samples, sr):
+        # pyworld GetSamplesForDIO / Harvest: int(1000 * num_samples / sr / frame_period) + 1 frames
+        return int(1000.0 * num_samples / sr / self.frame_period) * self.frame_period / 1000.0
+
+    def track(self, audio, sr):
+        import pyworld as pw
+
+        x = audio.astype(np.double)
+        if self.method == 'dio':
+            f0, time = pw.dio(x, sr, f0_floor=self.f0_floor, f0_ceil=self.f0_ceil, frame_period=self.frame_period)
+            f0 = pw.stonemask(x, f0, time, sr)
+        else:
+            f0, time = pw.harvest(x, sr, f0_floor=self.f0_floor, f0_ceil=self.f0_ceil, frame_period=self.frame_period)
+        confidence = (f0 > 0).astype(float)
+        frequency = np.where(f0 > 0, f0, np.nan)
+        return time, frequency, confidence
+
+
+class LibrosaEngine(PitchEngine):
+    """
+    librosa pYIN (확률적 voicing 판단 포함) / YIN (voicing 판단 없음, 가장 단순).
+    """
+    name = 'librosa'
+    METHODS = ('pyin', 'yin')
+
+    def __init__(self, method='pyin', fmin=librosa.note_to_hz('C2'), fmax=librosa.note_to_hz('C6'),
+                 frame_length=2048, frame_period=10.0):
+        assert method in self.METHODS, f"Unknown librosa pitch method: {method}"
+        self.method = method
+        self.fmin = fmin
+        self.fmax = fmax
+        self.frame_length = frame_length
+        self.frame_period = frame_period
+
+    def last_frame_time(self, num_samples, sr):
+        hop_length = int(sr * self.frame_period / 1000)
+        return (num_samples // hop_length) * hop_length / sr
+
+    def track(self, audio, sr):
+        hop_length = int(sr * self.frame_period / 1000)
+        if self.method == 'pyin':
+            frequency, _, confidence = librosa.pyin(
+                audio, fmin=self.fmin, fmax=self.fmax, sr=sr, frame_length=self.frame_length, hop_length=hop_length)
+        else:
+            frequency = librosa.yin(
+                audio, fmin=self.fmin, fmax=self.fmax, sr=sr, frame_length=self.frame_length, hop_length=hop_length)
+            confidence = np.ones_like(frequency)
+        time = librosa.times_like(frequency, sr=sr, hop_length=hop_length)
+        return time, frequency, confidence
+
+
+PITCH_ENGINES = {
+    CrepeEngine.name: CrepeEngine,
+    WorldEngine.name: WorldEngine,
+    LibrosaEngine.name: LibrosaEngine,
+}
+
+# 배포 tier 별 기본 엔진 설정: (엔진 이름, 생성자 kwargs)
+PITCH_ENGINE_TIERS = {
+    'accurate': ('crepe', {'capacity': 'full'}),
+    'balanced': ('crepe', {'capacity': 'small', 'decoder': 'banded_viterbi'}),
+    'fast': ('world', {'method': 'dio'}),
+}
+
+# 배포 단위 기본값. 환경변수 NORAEHE_PITCH_ENGINE 에 tier 이름 또는 엔진 이름 지정 가능.
+DEFAULT_PITCH_ENGINE = os.environ.get('NORAEHE_PITCH_ENGINE', 'accurate')
+# CREPE model 실행기. tensorflow 없는 경량 worker는 NORAEHE_CREPE_BACKEND=onnx (또는 tflite).
+DEFAULT_CREPE_BACKEND = os.environ.get('NORAEHE_CREPE_BACKEND', 'tensorflow')
+
+
+def get_pitch_engine(engine=None, **kwargs):
+    """
+    input:
+        - engine: PitchEngine 객체, 엔진 이름 ('crepe', 'world', 'librosa'), tier 이름 ('accurate', 'balanced', 'fast'),
+            또는 None (DEFAULT_PITCH_ENGINE).
+        - kwargs: 엔진 생성자 인자. tier 기본값을 덮어씀. decoder는 CREPE 전용 (다른 엔진에 지정하면 ValueError).
+    output:
+        - PitchEngine 객체
+    """
+    if isinstance(engine, PitchEngine):
+        if kwargs:
+            raise ValueError(f"Engine options {list(kwargs)} cannot be applied to an already built {engine.name} engine.")
+        return engine
+    engine = engine or DEFAULT_PITCH_ENGINE
+    if engine in PITCH_ENGINE_TIERS:
+        engine, tier_kwargs = PITCH_ENGINE_TIERS[engine]
+        kwargs = {**tier_kwargs, **kwargs}
+    if engine not in PITCH_ENGINES:
+        raise ValueError(f"Unknown pitch engine: {engine}. Choose one of {list(PITCH_ENGINES) + list(PITCH_ENGINE_TIERS)}")
+    if kwargs.get('decoder') and engine != CrepeEngine.name:
+        raise ValueError(f"Pitch decoder '{kwargs['decoder']}' only applies to the crepe engine, not {engine}.")
+    return PITCH_ENGINES[engine](**kwargs)
@@ -0,0 +1,536 @@
+# <src/pitch_detecting/separator.py>
+
+import os
+import time
+import inspect
+import contextlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.contextmanager
+def torch_threads(num_threads):
+    """
+    블록 안에서만 torch intra-op thread 수를 num_threads로 바꾸고 끝나면 이전 값으로 복원. None이면 그대로.
+    torch 설정은 프로세스 전역이므로 블록 실행 중에는 다른 thread의 torch 연산에도 적용됨.
+    """
+    previous = torch.get_num_threads()
+    if num_threads and num_threads != previous:
+        torch.set_num_threads(num_threads)
+    try:
+        yield
+    finally:
+        if torch.get_num_threads() != previous:
+            torch.set_num_threads(previous)
+
+
+class Separator:
+    """
+    Vocal 분리기 공통 interface. AudioProcessor.separate_vocals는 분리기 종류와 무관하게 이 method들만 사용.
+
+    separate(wav, sr) output:
+        - vocals (torch.Tensor): audio_channels x samples, self.samplerate 기준 vocal stem (cpu).
+    separate_ranges / separate_chunked 기본 구현은 전체 separate() (DSP 분리기처럼 전체 계산이 충분히 싼 경우).
+    latency:
+        - cold_start_sec: 생성자 소요 시간. last_call_sec / total_call_sec / num_calls: separate*() 호출 시간.
+        - total_audio_sec: 분리한 오디오 길이 합. sec_per_audio_sec (latency_report) 로 새 입력의 분리 시간 추정.
+    """
+    name = None
+    model_name = None
+    samplerate = None
+    audio_channels = None
+    # 출력에 영향이 없는 생성자 인자 (separator_config / StemCache key에서 제외)
+    runtime_args = ('num_threads', 'device')
+
+    def __init__(self):
+        self.cold_start_sec = 0.0
+        self.num_calls = 0
+        self.last_call_sec = None
+        self.total_call_sec = 0.0
+        self.total_audio_sec = 0.0
+        self.last_num_workers = 1
+        self.config = {}  # 출력을 결정하는 생성자 인자 (separator_config 참조)
+
+    def separate(self, wav, sr):
+        raise NotImplementedError
+
+    def separate_ranges(self, wav, sr, ranges, context=None):
+        """전체 separate() 후 ranges (start_sec, end_sec) 밖을 0으로 (DemucsSeparator.separate_ranges와 같은 출력 형태)."""
+        vocals = self.separate(wav, sr)
+        keep = torch.zeros(vocals.shape[-1], dtype=torch.bool)
+        for start, end in ranges:
+            keep[max(0, int(start * self.samplerate)):int(end * self.samplerate)] = True
+        return vocals * keep
+
+    def separate_chunked(self, wav, sr, num_workers=None, chunk_duration=60.0, crossfade=2.0, max_rss_mb=None):
+        return self.separate(wav, sr)
+
+    def separate_file(self, path):
+        """
+        path의 오디오를 읽어 separate(). output은 separate()와 같음.
+        """
+        wav, sr = sf.read(path, dtype='float32', always_2d=True)
+        return self.separate(wav.T, sr)
+
+    def save(self, vocals, path):
+        """16-bit wav로 저장. peak가 1을 넘으면 demucs clip='rescale'과 같이 전체를 줄임."""
+        vocals = vocals / max(1.01 * vocals.abs().max().item(), 1)
+        sf.write(path, vocals.T.numpy(), self.samplerate, subtype='PCM_16')
+
+    def record_call(self, start, num_samples):
+        self.last_call_sec = time.perf_counter() - start
+        self.total_call_sec += self.last_call_sec
+        self.total_audio_sec += num_samples / self.samplerate
+        self.num_calls += 1
+
+    def latency_report(self):
+        mean_call_sec = self.total_call_sec / self.num_calls if self.num_calls else None
+        sec_per_audio_sec = self.total_call_sec / self.total_audio_sec if self.total_audio_sec else None
+        return {
+            'cold_start_sec': self.cold_start_sec,
+            'num_calls': self.num_calls,
+            'last_call_sec': self.last_call_sec,
+            'mean_call_sec': mean_call_sec,
+            'sec_per_audio_sec': sec_per_audio_sec,
+        }
+
+
+class DemucsSeparator(Separator):
+    """
+    Demucs 모델을 프로세스 당 한 번 로드해 메모리 상의 waveform에서 vocal stem만 분리.
+    demucs.separate.main (CLI) 과 같은 정규화 / apply_model 호출이지만, 인자 파싱 / 모델 재로드 / stem 전체 저장이 없음.
+
+    input:
+        - model_name (str): demucs pretrained 모델 이름 (CLI '-n'). 기본 'htdemucs'.
+        - segment (float): 한 번에 모델에 넣는 길이 (sec, CLI '--segment'). None이면 모델 기본값.
+        - overlap (float): segment 간 overlap 비율 (CLI '--overlap'). 작을수록 segment 수가 줄어 빠름.
+        - shifts (int): random shift 횟수 (CLI '--shifts'). 클수록 느리고 약간 더 정확.
+        - num_threads (int): 분리 호출 동안만 쓸 torch intra-op thread 수 (호출이 끝나면 이전 값 복원).
+            None이면 호출 시점의 torch 설정 그대로.
+        - device (str): 'cpu' / 'cuda'. None이면 cuda 가능 시 cuda (quantize 시 CPU).
+        - quantize (bool): True면 Linear 레이어 (transformer / cross-attention) 를 int8 dynamic quantization (CPU 전용).
+            htdemucs 대비 note range / timbre 차이는 benchmark.py separation_tiers로 확인.
+    latency:
+        - cold_start_sec: 생성자 (모델 로드) 소요 시간. 이후 separate() 호출은 순수 inference 시간.
+    """
+    name = 'demucs'
+
+    def __init__(self, model_name='htdemucs', segment=None, overlap=0.25, shifts=1, num_threads=None, device=None,
+                 quantize=False):
+        from demucs.pretrained import get_model
+
+        super().__init__()
+        start = time.perf_counter()
+        self.num_threads = num_threads
+        self.device = device or ('cuda' if torch.cuda.is_available() and not quantize else 'cpu')
+        if quantize and self.device != 'cpu':
+            raise ValueError("int8 dynamic quantization is only supported on CPU. Use device='cpu'.")
+        self.model = get_model(model_name)
+        self.model.to(self.device)
+        self.model.eval()
+        if quantize:
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.quantize = quantize
+        self.config = {'model_name': model_name, 'segment': segment, 'overlap': overlap, 'shifts': shifts,
+                       'quantize': quantize}
+
+        self.model_name = model_name
+        self.segment = segment
+        self.overlap = overlap
+        self.shifts = shifts
+        self.samplerate = self.model.samplerate
+        self.audio_channels = self.model.audio_channels
+        self.vocals_index = self.model.sources.index('vocals')
+        # apply_model이 split 하는 segment 길이 / 간격 (sample). separate_ranges는 이 격자에 맞춰 읽음
+        models = getattr(self.model, 'models', [self.model])
+        self.segment_length = int(self.samplerate * (segment or min(float(model.segment) for model in models)))
+        self.stride = int((1 - overlap) * self.segment_length)
+        self.lock = threading.Lock()  # 같은 모델을 여러 thread가 동시에 쓰지 않도록
+
+        self.cold_start_sec = time.perf_counter() - start
+        logger.info(f"Loaded Demucs {model_name}{' (int8)' if quantize else ''} on {self.device} ({self.cold_start_sec:.2f}s)")
+
+    def prepare(self, wav, sr):
+        """
+        wav를 모델 sampling rate / channel 수로 변환하고 전체 곡 기준 정규화 (CLI와 같은 mean / std).
+        output: (정규화된 wav (audio_channels x samples), mean, std)
+        """
+        from demucs.audio import convert_audio
+
+        wav = torch.as_tensor(wav, dtype=torch.float32)
+        if wav.dim() == 1:
+            wav = wav[None]
+        wav = convert_audio(wav, sr, self.samplerate, self.audio_channels)
+        ref = wav.mean(0)
+        mean, std = ref.mean(), ref.std() + 1e-8
+        return (wav - mean) / std, mean, std
+
+    def apply(self, wav):
+        """정규화된 wav (audio_channels x samples) 의 vocal stem (정규화된 scale, cpu)."""
+        with self.lock, torch_threads(self.num_threads):
+            return self._apply(wav)
+
+    @torch.no_grad()
+    def _apply(self, wav):
+        from demucs.apply import apply_model
+
+        sources = apply_model(self.model, wav[None], shifts=self.shifts, split=True,
+                              overlap=self.overlap, segment=self.segment, device=self.device, progress=False)
+        return sources[0, self.vocals_index].cpu()
+
+    def separate(self, wav, sr):
+        """
+        input:
+            - wav (np.ndarray | torch.Tensor): channels x samples (mono면 samples) float waveform.
+            - sr (int): wav sampling rate. 모델 sampling rate와 다르면 resample.
+        output:
+            - vocals (torch.Tensor): audio_channels x samples, self.samplerate 기준 vocal stem (cpu).
+        """
+        start = time.perf_counter()
+        wav, mean, std = self.prepare(wav, sr)
+        vocals = self.apply(wav) * std + mean
+        self.record_call(start, vocals.shape[-1])
+        return vocals
+
+    def separate_ranges(self, wav, sr, ranges, context=None):
+        """
+        ranges 구간만 앞뒤 context 만큼 문맥을 붙여 분리. Demucs 비용은 곡 길이가 아닌 분석 구간 길이에 비례.
+        정규화는 전체 곡 기준이고 읽기 시작점을 apply_model segment 격자에 맞추므로, context >= segment 길이면
+        구간 안쪽은 전체 분리와 같은 segment 들로 계산됨 (shifts=0이면 동일한 값, shifts > 0은 random shift 만큼만 다름).
+        input:
+            - wav, sr: separate()와 같음.
+            - ranges (list): 분리할 (start_sec, end_sec) 목록. analysis_plan() 참조.
+            - context (float): 구간 앞뒤로 추가 분리 후 버리는 길이 (sec). None이면 segment 길이.
+        output:
+            - vocals (torch.Tensor): separate()와 같은 shape (전체 길이). ranges 밖은 0.
+        """
+        start = time.perf_counter()
+        wav, mean, std = self.prepare(wav, sr)
+        num_samples = wav.shape[-1]
+        vocals = torch.zeros_like(wav)
+        pad = self.segment_length if context is None else int(context * self.samplerate)
+        separated = 0
+        for range_start, range_end in merge_ranges(ranges, 2 * pad / self.samplerate):
+            keep_start = max(0, int(range_start * self.samplerate))
+            keep_end = min(num_samples, int(range_end * self.samplerate))
+            if keep_start >= keep_end:
+                continue
+            read_start = max(0, keep_start - pad) // self.stride * self.stride
+            read_end = min(num_samples, keep_end + pad)
+            stem = self.apply(wav[:, read_start:read_end])
+            vocals[:, keep_start:keep_end] = stem[:, keep_start - read_start:keep_end - read_start] * std + mean
+            separated += keep_end - keep_start
+        self.record_call(start, separated)
+        return vocals
+
+    def separate_chunked(self, wav, sr, num_workers=None, chunk_duration=60.0, crossfade=2.0, max_rss_mb=None):
+        """
+        wav를 crossfade 만큼 겹치는 chunk_duration 길이 chunk로 나눠 thread pool에서 동시에 분리 후 linear cross-fade로 이어 붙임.
+        긴 곡에서 apply_model 한 번이 CPU core를 다 쓰지 못하는 경우 용. worker 당 torch thread 수는 core 수 / worker 수.
+        chunk 시작점은 apply_model segment 격자에 맞춤 (chunk 경계 부근 외에는 전체 분리와 같은 segment 들로 계산).
+        input:
+            - wav, sr: separate()와 같음.
+            - num_workers (int): 동시에 분리할 chunk 수. None이면 CPU core 수.
+            - chunk_duration (float): chunk 간격 (sec). 실제 chunk 길이는 chunk_duration + crossfade.
+            - crossfade (float): 이웃 chunk가 겹치는 길이 (sec).
+            - max_rss_mb (float): 프로세스 RSS 상한 (MB). 첫 chunk를 단독 실행해 chunk 당 RSS 증가량을 잰 뒤
+              상한을 넘지 않도록 worker 수를 줄임 (psutil 필요). None이면 제한 X.
+        output:
+            - vocals (torch.Tensor): separate()와 같음.
+        """
+        start = time.perf_counter()
+        wav, mean, std = self.prepare(wav, sr)
+        num_samples = wav.shape[-1]
+        hop = max(1, round(chunk_duration * self.samplerate / self.stride)) * self.stride
+        fade = min(int(crossfade * self.samplerate), hop)
+        chunks = [(offset, min(num_samples, offset + hop + fade)) for offset in range(0, num_samples, hop)]
+        if len(chunks) > 1 and chunks[-1][1] - chunks[-1][0] <= fade:
+            chunks.pop()  # 마지막 chunk가 앞 chunk의 cross-fade 구간 안에 다 들어감
+
+        vocals = torch.zeros_like(wav)
+        sum_weight = torch.zeros(num_samples)
+        ramp = (torch.arange(fade) + 0.5) / fade
+
+        def add(chunk, stem):
+            chunk_start, chunk_end = chunk
+            weight = torch.ones(chunk_end - chunk_start)
+            if fade and chunk_start > 0:
+                weight[:fade] = ramp
+            if fade and chunk_end < num_samples:
+                weight[-fade:] = torch.minimum(weight[-fade:], 1 - ramp)
+            vocals[:, chunk_start:chunk_end] += stem * weight
+            sum_weight[chunk_start:chunk_end] += weight
+
+        num_workers = min(num_workers or os.cpu_count(), len(chunks))
+        num_threads = self.num_threads or torch.get_num_threads()
+        with self.lock, torch_threads(self.num_threads):
+            if max_rss_mb is not None and num_workers > 1:
+                # 첫 chunk 단독 실행으로 chunk 당 RSS 증가량 측정
+                base_mb, stem, peak_mb = self._measure_rss(lambda: self._apply(wav[:, chunks[0][0]:chunks[0][1]]))
+                add(chunks[0], stem)
+                chunks = chunks[1:]
+                chunk_mb = max(peak_mb - base_mb, 1.0)
+                num_workers = max(1, min(num_workers, len(chunks), int((max_rss_mb - base_mb) // chunk_mb)))
+                logger.info(f"Demucs chunk RSS {chunk_mb:.0f} MB, base {base_mb:.0f} MB -> {num_workers} workers")
+            with torch_threads(max(1, num_threads // num_workers)), ThreadPoolExecutor(num_workers) as pool:
+                for chunk, stem in zip(chunks, pool.map(lambda c: self._apply(wav[:, c[0]:c[1]]), chunks)):
+                    add(chunk, stem)
+        vocals = vocals / sum_weight * std + mean
+        self.last_num_workers = num_workers
+        self.record_call(start, vocals.shape[-1])
+        return vocals
+
+    @staticmethod
+    def _measure_rss(fn, interval=0.02):
+        """fn() 실행 중 RSS를 interval 마다 sampling. (실행 전 RSS MB, fn 결과, 실행 중 최대 RSS MB)"""
+        import psutil
+
+        process = psutil.Process()
+        base_mb = peak_mb = process.memory_info().rss / 1024 ** 2
+        done = threading.Event()
+
+        def monitor():
+            nonlocal peak_mb
+            while not done.wait(interval):
+                peak_mb = max(peak_mb, process.memory_info().rss / 1024 ** 2)
+
+        thread = threading.Thread(target=monitor, daemon=True)
+        thread.start()
+        try:
+            result = fn()
+        finally:
+            done.set()
+            thread.join()
+        return base_mb, result, max(peak_mb, process.memory_info().rss / 1024 ** 2)
+
+    def save(self, vocals, path):
+        """demucs CLI 기본 출력 (16-bit wav, clip='rescale') 과 같은 형식으로 저장."""
+        from demucs.audio import save_audio
+
+        save_audio(vocals, path, samplerate=self.samplerate, clip='rescale', bits_per_sample=16)
+
+
+class DspSeparator(Separator):
+    """
+    신경망 없이 STFT mask 만으로 vocal 근사 분리. 가운데 panning 된 vocal / 거의 a cappella 녹음 용.
+        1. mid / side: 좌우 채널 STFT가 같은 크기 / 위상일수록 1인 center mask (mono 입력은 1).
+        2. HPSS: librosa median filtering의 harmonic soft mask로 drum 등 percussive 성분 제거.
+        3. vocal band-pass: low_hz 이하 / high_hz 이상은 0, band 안쪽 양 끝 taper_octaves 동안 cosine으로 증가.
+           감쇠 구간이 band 안쪽이라 low_hz 아래 bass (e.g. 50 Hz) 는 통과하지 않음.
+    input:
+        - samplerate (int): 출력 sampling rate.
+        - n_fft, hop_length (int): STFT 설정.
+        - low_hz, high_hz (float): vocal band 범위 (Hz).
+        - taper_octaves (float): band 양 끝 cosine 감쇠 폭 (octave).
+        - margin (float): HPSS margin. 클수록 harmonic mask가 엄격해짐.
+    """
+    name = 'dsp'
+    model_name = 'dsp'
+    audio_channels = 1
+
+    def __init__(self, samplerate=44100, n_fft=2048, hop_length=512, low_hz=80.0, high_hz=8000.0, margin=1.0,
+                 taper_octaves=0.5):
+        super().__init__()
+        self.samplerate = samplerate
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.low_hz = low_hz
+        self.high_hz = high_hz
+        self.margin = margin
+        self.taper_octaves = taper_octaves
+        self.config = {'samplerate': samplerate, 'n_fft': n_fft, 'hop_length': hop_length, 'low_hz': low_hz,
+                       'high_hz': high_hz, 'margin': margin, 'taper_octaves': taper_octaves}
+
+    def band_mask(self):
+        """(n_fft // 2 + 1) 개 frequency bin 별 band-pass 가중치."""
+        import librosa
+
+        freqs = np.maximum(librosa.fft_frequencies(sr=self.samplerate, n_fft=self.n_fft), 1e-3)
+        octaves = np.minimum(np.log2(freqs / self.low_hz), np.log2(self.high_hz / freqs))
+        # band 경계 (low_hz, high_hz) 에서 0, 안쪽 taper_octaves 동안 cosine 증가, 그 안은 1, band 밖은 0
+        taper = 0.5 * (1 - np.cos(np.pi * np.clip(octaves / self.taper_octaves, 0, 1)))
+        return np.where(octaves > 0, taper, 0.0)
+
+    def separate(self, wav, sr):
+        import librosa
+
+        start = time.perf_counter()
+        wav = np.asarray(wav, dtype=np.float32)
+        if wav.ndim == 1:
+            wav = wav[None]
+        if sr != self.samplerate:
+            wav = librosa.resample(wav, orig_sr=sr, target_sr=self.samplerate)
+        spec = librosa.stft(wav, n_fft=self.n_fft, hop_length=self.hop_length)  # channels x freq x frames
+        mid = spec.mean(axis=0)
+        if len(spec) >= 2:
+            left, right = spec[0], spec[1]
+            # 좌우 성분의 정규화 내적: 가운데 (L == R) 면 1, 한쪽으로 panning / 역위상이면 0에 가까움
+            center = 2 * np.real(left * np.conj(right)) / (np.abs(left) ** 2 + np.abs(right) ** 2 + 1e-10)
+            mid = mid * np.clip(center, 0, 1)
+        # band-pass로 0이 되는 bin은 HPSS (median filter, 가장 비싼 단계) 에서 제외
+        band = self.band_mask()
+        bins = np.flatnonzero(band > 0)
+        harmonic, _ = librosa.decompose.hpss(np.abs(mid[bins[0]:bins[-1] + 1]), margin=self.margin, mask=True)
+        vocal_spec = np.zeros_like(mid)
+        vocal_spec[bins[0]:bins[-1] + 1] = mid[bins[0]:bins[-1] + 1] * harmonic * band[bins[0]:bins[-1] + 1, None]
+        vocals = librosa.istft(vocal_spec, hop_length=self.hop_length, n_fft=self.n_fft, length=wav.shape[-1])
+        vocals = torch.from_numpy(vocals[None].astype(np.float32))
+        self.record_call(start, vocals.shape[-1])
+        return vocals
+
+
+def merge_ranges(ranges, gap=0.0):
+    """(start_sec, end_sec) 목록을 정렬 후 gap (sec) 이하로 떨어진 구간끼리 합침."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start - merged[-1][1] <= gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def analysis_plan(duration, trim_duration=20.0, num_excerpts=None, excerpt_duration=30.0):
+    """
+    음역대 / timbre 분석에 쓰는 구간만 고른 분리 계획.
+    detect_pitch_range는 전후 trim_duration을 버리므로 그 안쪽 구간만, num_excerpts가 있으면 그 안에서
+    균등 간격 excerpt_duration 길이 excerpt num_excerpts 개만 분리 (excerpt 밖 frame은 음역대 계산에서 빠짐).
+    input:
+        - duration (float): 곡 길이 (sec)
+    output:
+        - ranges (list): (start_sec, end_sec) 목록. 곡이 2 * trim_duration 보다 짧으면 전체.
+    """
+    start, end = trim_duration, duration - trim_duration
+    if end <= start:
+        return [(0.0, duration)]
+    if not num_excerpts or num_excerpts * excerpt_duration >= end - start:
+        return [(start, end)]
+    step = (end - start - excerpt_duration) / max(1, num_excerpts - 1)
+    first = start if num_excerpts > 1 else (start + end - excerpt_duration) / 2
+    return [(first + i * step, first + i * step + excerpt_duration) for i in range(num_excerpts)]
+
+
+# needs_separation 기본 임계값. benchmark.py skip_separation 으로 보정.
+#   flatness: active frame spectral flatness 중앙값 상한 (목소리만 있으면 harmonic 해서 낮음)
+#   harmonic_db: HPSS harmonic / percussive 에너지 비 (dB) 하한 (drum / 타악기 반주가 있으면 낮음)
+#   low_band: 80 Hz 미만 에너지 비율 상한 (bass / kick 반주가 있으면 높음)
+SKIP_SEPARATION_THRESHOLDS = {'flatness': 0.02, 'harmonic_db': 6.0, 'low_band': 0.05}
+
+
+def separation_features(wav, sr, analysis_sr=16000, n_fft=1024, hop_length=256, low_hz=80.0, silence_db=40.0):
+    """
+    분리 필요 여부 판단용 특징을 analysis_sr mono STFT 한 번으로 계산. 무음 frame (최대 대비 silence_db 이하) 은 제외.
+    input:
+        - wav (np.ndarray): channels x samples (mono면 samples) waveform.
+        - sr (int): wav sampling rate.
+    output:
+        - features (dict): 'flatness', 'harmonic_db', 'low_band' (SKIP_SEPARATION_THRESHOLDS 참조).
+    """
+    import librosa
+
+    y = np.asarray(wav, dtype=np.float32)
+    y = y.mean(axis=0) if y.ndim == 2 else y
+    if sr != analysis_sr:
+        y = librosa.resample(y, orig_sr=sr, target_sr=analysis_sr)
+    power = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length)) ** 2
+    frame_power = power.sum(axis=0)
+    active = frame_power >= frame_power.max() * 10 ** (-silence_db / 10) if frame_power.any() else frame_power > 0
+    power = power[:, active]
+    if power.shape[1] == 0:
+        return {'flatness': 1.0, 'harmonic_db': 0.0, 'low_band': 0.0}
+
+    flatness = np.exp(np.mean(np.log(power + 1e-12), axis=0)) / (np.mean(power, axis=0) + 1e-12)
+    harmonic, percussive = librosa.decompose.hpss(np.sqrt(power))
+    harmonic_db = 10 * np.log10((np.sum(harmonic ** 2) + 1e-12) / (np.sum(percussive ** 2) + 1e-12))
+    freqs = librosa.fft_frequencies(sr=analysis_sr, n_fft=n_fft)
+    low_band = power[freqs < low_hz].sum() / power.sum()
+    return {'flatness': float(np.median(flatness)), 'harmonic_db': float(harmonic_db), 'low_band': float(low_band)}
+
+
+def needs_separation(features, thresholds=None):
+    """
+    separation_features 결과가 하나라도 임계값을 벗어나면 True (반주가 있다고 보고 분리).
+    thresholds: SKIP_SEPARATION_THRESHOLDS 형태 dict. None이면 기본값.
+    """
+    thresholds = {**SKIP_SEPARATION_THRESHOLDS, **(thresholds or {})}
+    return not (features['flatness'] <= thresholds['flatness'] and features['harmonic_db'] >= thresholds['harmonic_db']
+                and features['low_band'] <= thresholds['low_band'])
+
+
+SEPARATORS = {
+    DemucsSeparator.name: DemucsSeparator,
+    DspSeparator.name: DspSeparator,
+}
+
+# 분리 tier 별 설정: (분리기 이름, 생성자 kwargs)
+SEPARATOR_TIERS = {
+    'accurate': ('demucs', {'model_name': 'htdemucs'}),
+    'light': ('demucs', {'model_name': 'htdemucs', 'quantize': True, 'overlap': 0.1}),
+    'fast': ('dsp', {}),
+}
+
+# 배포 단위 기본값. 환경변수 NORAEHE_SEPARATOR 에 tier 이름 또는 분리기 이름 지정 가능.
+DEFAULT_SEPARATOR = os.environ.get('NORAEHE_SEPARATOR', 'accurate')
+
+_separators = {}
+_separators_lock = threading.Lock()
+
+
+def _separator_key(separator, kwargs):
+    """(분리기 이름, 생성자 kwargs) 로 tier / 기본값 해석."""
+    separator = separator or DEFAULT_SEPARATOR
+    if separator in SEPARATOR_TIERS:
+        separator, tier_kwargs = SEPARATOR_TIERS[separator]
+        kwargs = {**tier_kwargs, **kwargs}
+    if separator not in SEPARATORS:
+        raise ValueError(f"Unknown separator: {separator}. Choose one of {list(SEPARATORS) + list(SEPARATOR_TIERS)}")
+    return separator, kwargs
+
+
+def get_separator(separator=None, **kwargs):
+    """
+    프로세스 전역에서 공유하는 Separator 반환. 같은 (분리기, kwargs) 조합에 대해서는 한 번만 로드함.
+    input:
+        - separator: Separator 객체, 분리기 이름 ('demucs', 'dsp'), tier 이름 ('accurate', 'light', 'fast'),
+            또는 None (DEFAULT_SEPARATOR).
+        - kwargs: 분리기 생성자 인자. tier 기본값을 덮어씀.
+    """
+    if isinstance(separator, Separator):
+        if kwargs:
+            raise ValueError(f"Separator options {list(kwargs)} cannot be applied to an already built {separator.name} separator.")
+        return separator
+    separator, kwargs = _separator_key(separator, kwargs)
+    key = (separator, tuple(sorted(kwargs.items())))
+    with _separators_lock:
+        instance = _separators.get(key)
+        if instance is None:
+            instance = SEPARATORS[separator](**kwargs)
+            _separators[key] = instance
+    return instance
+
+
+def separator_config(separator=None, **kwargs):
+    """
+    get_separator()와 같은 인자로 (분리기 이름, 출력을 결정하는 생성자 인자 전체) 반환. 모델을 로드하지 않음 (StemCache key 용).
+    """
+    if isinstance(separator, Separator):
+        return separator.name, separator.config
+    separator, kwargs = _separator_key(separator, kwargs)
+    arguments = inspect.signature(SEPARATORS[separator]).bind(**kwargs)
+    arguments.apply_defaults()
+    return separator, {k: v for k, v in arguments.arguments.items() if k not in Separator.runtime_args}
+
+
+def loaded_separator(separator=None, **kwargs):
+    """get_separator()와 같은 인자. 이미 로드된 Separator만 반환 (없으면 None, 새로 로드하지 않음)."""
+    if isinstance(separator, Separator):
+        return separator
+    separator, kwargs = _separator_key(separator, kwargs)
+    with _separators_lock:
+        return _separators.get((separator, tuple(sorted(kwargs.items()))))
@@ -0,0 +1,175 @@
+# <src/pitch_detecting/stem_cache.py>
+
+import io
+import os
+import json
+import uuid
+import hashlib
+import logging
+import threading
+import contextlib
+import numpy as np
+import soundfile as sf
+
+try:
+    import fcntl
+except ImportError:  # Windows: 프로세스 간 lock 없이 (프로세스 안 thread lock만) 동작
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# key 형식 / 저장 형식이 바뀌면 올려서 이전 항목을 무효화
+CACHE_VERSION = 1
+FORMATS = ('npz', 'flac')
+
+
+class StemCache:
+    """
+    분리된 vocal stem (mono) 의 디스크 cache. key는 원곡 waveform content hash + 분리기 설정 + 분리 방식.
+    같은 YouTube 곡 재처리 / 같은 파일 재업로드 시 분리기 (모델 로드 포함) 를 건너뜀.
+        - 저장: 임시 파일에 쓴 뒤 os.replace (atomic) 이므로 읽는 쪽은 완성된 파일만 봄.
+        - LRU: hit 시 파일 mtime 갱신, 총 크기가 max_mb를 넘으면 mtime이 오래된 것부터 삭제.
+        - 여러 worker process: 삭제 (evict) 는 cache_dir/.lock 에 대한 flock 안에서만 수행.
+          읽는 중 다른 process가 지워도 이미 연 파일은 끝까지 읽힘 (POSIX). 열기 전에 지워지면 miss.
+    input:
+        - cache_dir (str): cache 디렉토리.
+        - max_mb (float): cache 총 크기 상한 (MB).
+        - format (str): 'npz' (float16, zip 압축) 또는 'flac' (24-bit, +-1 밖은 clip).
+    """
+    def __init__(self, cache_dir, max_mb=2048, format='npz'):
+        assert format in FORMATS, f"Unknown stem cache format: {format}"
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 ** 2)
+        self.format = format
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def audio_hash(wav, sr):
+        """waveform (shape / dtype 포함) + sampling rate의 sha256."""
+        wav = np.ascontiguousarray(wav, dtype=np.float32)
+        digest = hashlib.sha256(f'{wav.shape}:{sr}:'.encode())
+        digest.update(wav.data)
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(audio_hash, separator_config, method):
+        """
+        input:
+            - audio_hash (str): audio_hash() 결과.
+            - separator_config (tuple): separator.separator_config() 결과 (분리기 이름, 생성자 인자).
+            - method: 분리 방식 (전체 / 구간 / chunk 병렬 및 그 설정). json 직렬화 가능해야 함.
+        """
+        payload = json.dumps([CACHE_VERSION, audio_hash, separator_config, method], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.{self.format}')
+
+    def get(self, key):
+        """cache된 (vocals (mono float32 np.ndarray), sr). 없으면 None."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # LRU 순서 갱신
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.format == 'npz':
+            with np.load(io.BytesIO(data)) as npz:
+                return npz['vocals'].astype(np.float32), int(npz['sr'])
+        vocals, sr = sf.read(io.BytesIO(data), dtype='float32')
+        return vocals, sr
+
+    def put(self, key, vocals, sr):
+        """vocals (mono) 를 atomic 하게 저장 후 크기 상한에 맞춰 evict."""
+        path = self.path(key)
+        tmp_path = f'{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp'
+        try:
+            if self.format == 'npz':
+                with open(tmp_path, 'wb') as f:
+                    np.savez_compressed(f, vocals=np.asarray(vocals, dtype=np.float16), sr=sr)
+            else:
+                sf.write(tmp_path, np.clip(vocals, -1, 1), sr, format='FLAC', subtype='PCM_24')
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        """같은 cache_dir을 쓰는 모든 process / thread 사이의 배타 lock."""
+        with self.lock, open(os.path.join(self.cache_dir, '.lock'), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def entries(self):
+        """(mtime, size, path) 목록. 작성 중인 임시 파일 / lock 파일 제외."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(FORMATS):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """총 크기가 max_bytes 이하가 될 때까지 오래 안 쓴 항목부터 삭제. 삭제한 항목 수 반환."""
+        with self.exclusive():
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+                total -= size
+                removed += 1
+        if removed:
+            logger.info(f"Evicted {removed} stems from {self.cache_dir} ({total / 1024 ** 2:.0f} MB left)")
+        return removed
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(entries),
+            'size_mb': sum(size for _, size, _ in entries) / 1024 ** 2,
+        }
+
+
+# 배포 단위 설정. NORAEHE_STEM_CACHE_DIR 미지정 시 AudioProcessor의 data 디렉토리 아래 stem_cache.
+DEFAULT_STEM_CACHE_DIR = os.environ.get('NORAEHE_STEM_CACHE_DIR')
+DEFAULT_STEM_CACHE_MB = float(os.environ.get('NORAEHE_STEM_CACHE_MB', 2048))
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_stem_cache(cache_dir, **kwargs):
+    """
+    프로세스 전역에서 공유하는 StemCache 반환 (cache_dir 별 하나). kwargs: StemCache 생성자 인자 (처음 만들 때만 적용).
+    """
+    cache_dir = os.path.abspath(cache_dir)
+    with _caches_lock:
+        cache = _caches.get(cache_dir)
+        if cache is None:
+            cache = StemCache(cache_dir, **{'max_mb': DEFAULT_STEM_CACHE_MB, **kwargs})
+            _caches[cache_dir] = cache
+    return cache
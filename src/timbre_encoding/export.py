@@ -0,0 +1,128 @@
+# timbre_encoding/export.py
+
+import os
+import hashlib
+import logging
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('torch', 'torchscript', 'onnx')
+
+
+def export_torchscript(model, path, num_frames=250, input_dim=80):
+    """
+    LSTMSpeakerEncoder.inference 를 TorchScript (trace) 로 저장.
+    window 길이는 num_frames로 고정, batch 크기는 자유.
+    """
+    model.eval()
+    example = torch.zeros(2, num_frames, input_dim, device=next(model.parameters()).device)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    traced.save(path)
+    logger.info(f"Exported speaker encoder to TorchScript: {path}")
+    return path
+
+
+def export_onnx(model, path, num_frames=250, input_dim=80, opset_version=17):
+    """
+    LSTMSpeakerEncoder.inference 를 ONNX로 저장. 입력 'mel' (batch x num_frames x input_dim), 출력 'embedding'.
+    window 길이는 num_frames로 고정, batch 축만 dynamic.
+    """
+    model.eval()
+    example = torch.zeros(2, num_frames, input_dim, device=next(model.parameters()).device)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (example,),
+            path,
+            input_names=['mel'],
+            output_names=['embedding'],
+            dynamic_axes={'mel': {0: 'batch'}, 'embedding': {0: 'batch'}},
+            opset_version=opset_version,
+            dynamo=False,
+        )
+    logger.info(f"Exported speaker encoder to ONNX: {path}")
+    return path
+
+
+class OnnxSpeakerEncoder:
+    """
+    ONNX Runtime (CPU) 으로 export된 speaker encoder 실행. torch 없이 numpy 입출력만 사용.
+    input:
+        - path (str): export_onnx()로 저장한 .onnx 파일 경로.
+        - num_threads (int): intra-op thread 수. None이면 onnxruntime 기본값.
+    """
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+
+    def inference(self, frames):
+        """
+        frames (np.ndarray): batch x num_frames x input_dim -> embeddings (np.ndarray): batch x proj_dim
+        """
+        return self.session.run(['embedding'], {'mel': np.ascontiguousarray(frames, dtype=np.float32)})[0]
+
+
+def model_fingerprint(model, source_path=None, *tags):
+    """
+    export 파일 이름에 넣을 원본 식별자. source_path (checkpoint) 가 있으면 그 파일 내용, 없으면 model state_dict의 sha256.
+    tags (backend, num_frames 등) 도 함께 hash 하므로 다른 checkpoint / 설정의 export 파일을 재사용하지 않음.
+    """
+    digest = hashlib.sha256(repr(tags).encode())
+    if source_path is not None:
+        with open(source_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    else:
+        for name, value in model.state_dict().items():
+            digest.update(name.encode())
+            if isinstance(value, torch.Tensor):
+                digest.update(value.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+class ExportedSpeakerEncoder:
+    """
+    SpkEncoderHelper에서 eager LSTMSpeakerEncoder 대신 쓰는 TorchScript / ONNX Runtime 실행기.
+    export 시 고정한 num_frames와 다른 길이의 window (짧은 녹음) 는 eager 모델로 처리.
+
+    input:
+        - model (LSTMSpeakerEncoder): checkpoint 로드된 eager 모델.
+        - backend (str): 'torchscript' 또는 'onnx'.
+        - export_dir (str): export 파일 저장 / 재사용 경로. 파일 이름에 model_fingerprint()가 들어가므로
+            checkpoint 내용 / backend / num_frames가 같은 export 파일만 재사용하고, 없으면 새로 export.
+        - source_path (str): export 원본 checkpoint 경로. None이면 model weight로 fingerprint 계산.
+    """
+    def __init__(self, model, backend, export_dir, source_path=None, num_frames=250, input_dim=80, num_threads=None):
+        assert backend in BACKENDS[1:], f"Unknown exported backend: {backend}"
+        self.model = model
+        self.backend = backend
+        self.num_frames = num_frames
+        os.makedirs(export_dir, exist_ok=True)
+        fingerprint = model_fingerprint(model, source_path, backend, num_frames, input_dim)
+
+        if backend == 'torchscript':
+            self.path = os.path.join(export_dir, f'speaker_encoder_{num_frames}_{fingerprint}.ts')
+            if not os.path.exists(self.path):
+                export_torchscript(model, self.path, num_frames, input_dim)
+            self.runtime = torch.jit.load(self.path, map_location=next(model.parameters()).device)
+        else:
+            self.path = os.path.join(export_dir, f'speaker_encoder_{num_frames}_{fingerprint}.onnx')
+            if not os.path.exists(self.path):
+                export_onnx(model, self.path, num_frames, input_dim)
+            self.runtime = OnnxSpeakerEncoder(self.path, num_threads=num_threads)
+
+    @torch.no_grad()
+    def inference(self, frames):
+        if frames.shape[1] != self.num_frames:
+            return self.model.inference(frames)
+        if self.backend == 'torchscript':
+            return self.runtime(frames)
+        embeddings = self.runtime.inference(frames.cpu().numpy())
+        return torch.from_numpy(embeddings).to(frames.device)
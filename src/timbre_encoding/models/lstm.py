@@ -14,9 +14,10 @@ class LSTMWithProjection(nn.Module):
         self.lstm = nn.LSTM(input_size, hidden_size, batch_first=True)
         self.linear = nn.Linear(hidden_size, proj_size, bias=False)
 
-    def forward(self, x):
-        self.lstm.flatten_parameters()
+    def forward(self, x, last_step_only=False):
         o, (_, _) = self.lstm(x)
+        if last_step_only:
+            o = o[:, -1]
         return self.linear(o)
 
 
@@ -62,11 +63,24 @@ class LSTMSpeakerEncoder(nn.Module):
             elif "weight" in name:
                 nn.init.xavier_normal_(param)
 
+    def flatten_parameters(self):
+        """
+        Compact LSTM weights once after the model is moved to its device, instead of on every forward.
+        Only has an effect with cuDNN, dynamic quantized LSTMs are skipped.
+        """
+        for module in self.layers.modules():
+            if isinstance(module, nn.LSTM):
+                module.flatten_parameters()
+
     def forward(self, x):
-        d = self.layers(x)
         if self.use_lstm_with_projection:
-            d = torch.nn.functional.normalize(d[:, -1], p=2, dim=1)
+            for layer in self.layers[:-1]:
+                x = layer(x)
+            # only the last time step of the last layer is used, so project just that step
+            d = self.layers[-1](x, last_step_only=True)
+            d = torch.nn.functional.normalize(d, p=2, dim=1)
         else:
+            d = self.layers(x)
             d = torch.nn.functional.normalize(d, p=2, dim=1)
         return d
 
@@ -74,6 +88,27 @@ class LSTMSpeakerEncoder(nn.Module):
     def inference(self, x):
         return self.forward(x)
 
+    @staticmethod
+    def get_window_offsets(max_len, num_frames=250, num_eval=10):
+        """
+        Start frames of `num_eval` evenly spaced windows of `num_frames` frames.
+        Windows starting at the same frame (short inputs) are merged and counted instead of being recomputed.
+        Returns: (offsets, counts, num_frames)
+        """
+        if max_len < num_frames:
+            num_frames = max_len
+
+        offsets = np.linspace(0, max_len - num_frames, num=num_eval).astype(int)
+        offsets, counts = np.unique(offsets, return_counts=True)
+        return offsets, counts, num_frames
+
+    def get_windows(self, x, num_frames=250, num_eval=10):
+        """
+        Windows as views of x (no copy) with the number of times each one was sampled
+        x: 1xTxD -> ([num_frames x D, ...], counts)
+        """
+        offsets, counts, num_frames = self.get_window_offsets(x.shape[1], num_frames, num_eval)
+        return [x[0, offset:offset + num_frames] for offset in offsets], counts
 
     def compute_embedding(
         self, x, num_frames=250, num_eval=10, return_mean=True, infer=False
@@ -82,28 +117,26 @@ class LSTMSpeakerEncoder(nn.Module):
         Generate embeddings for a batch of utterances
         x: 1xTxD
         """
-        max_len = x.shape[1]
-
-        if max_len < num_frames:
-            num_frames = max_len
-
-        offsets = np.linspace(0, max_len - num_frames, num=num_eval)
-
-        frames_batch = []
-        for offset in offsets:
-            offset = int(offset)
-            end_offset = int(offset + num_frames)
-            frames = x[:, offset:end_offset]
-            frames_batch.append(frames)
-
-        frames_batch = torch.cat(frames_batch, dim=0)
+        windows, counts = self.get_windows(x, num_frames, num_eval)
+        frames_batch = torch.stack(windows)
 
         if infer:
             embeddings = self.inference(frames_batch)
         else:
             embeddings = self.forward(frames_batch)
 
+        counts = torch.from_numpy(counts).to(embeddings)
         if return_mean:
-            embeddings = torch.mean(embeddings, dim=0, keepdim=True)
+            embeddings = torch.sum(embeddings * counts[:, None], dim=0, keepdim=True) / counts.sum()
+        else:
+            embeddings = torch.repeat_interleave(embeddings, counts.long(), dim=0)
 
         return embeddings
+
+
+def quantize_speaker_encoder(model):
+    """
+    Int8 dynamic quantization of the LSTM and Linear layers for CPU inference.
+    Weights are stored as int8, activations are quantized on the fly per batch.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
@@ -2,19 +2,29 @@
 
 import os
 import sys
+import time
+import logging
+import threading
+import librosa
+import numpy as np
 import torch
 import torch.nn as nn
-from .models.lstm import LSTMSpeakerEncoder
+from .models.lstm import LSTMSpeakerEncoder, quantize_speaker_encoder
+from .export import BACKENDS, ExportedSpeakerEncoder
 from utils.config import SpeakerEncoderConfig
-from utils.audio import AudioProcessor
+from utils.audio import AudioProcessor, AudioContext, TorchMelSpectrogram
 from utils.read_json import read_json
 
+logger = logging.getLogger(__name__)
+
+PRETRAINED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pretrained_timbre_enc')
+
 
 class SpkEncoderHelper(nn.Module):
-    def __init__(self, root_path=None, use_cuda=False):
+    def __init__(self, root_path=None, use_cuda=False, use_torch_frontend=False, windowed_mel=True, max_duration=None):
         super(SpkEncoderHelper, self).__init__()
         # 모델 및 설정 파일 경로 설정
-        self.config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pretrained_timbre_enc/config.json')
+        self.config_path = os.path.join(PRETRAINED_DIR, 'config.json')
         if root_path:
             self.config_path = os.path.join(root_path, self.config_path)
         # 설정 로드
@@ -29,33 +39,285 @@ class SpkEncoderHelper(nn.Module):
             self.config.model_params["num_lstm_layers"],
         )
         self.use_cuda = use_cuda
+        self.device = torch.device('cuda' if use_cuda else 'cpu')
 
         # 오디오 프로세서 초기화
         self.speaker_encoder_ap = AudioProcessor(**self.config.audio)
         self.speaker_encoder_ap.do_sound_norm = True
         self.speaker_encoder_ap.do_trim_silence = True
+        # torch mel front end: 여러 waveform을 batch로 mel 변환, NumPy 거치지 않고 바로 LSTM 입력으로 사용
+        self.use_torch_frontend = use_torch_frontend
+        self.torch_frontend = TorchMelSpectrogram(self.speaker_encoder_ap)
+        # TorchScript / ONNX Runtime 실행기. None이면 eager speaker_encoder로 inference.
+        self.exported_encoder = None
+        # window offset 먼저 정하고 그 window가 쓰는 sample 구간만 STFT (전체 mel 계산 X)
+        self.windowed_mel = windowed_mel
+        # 이 길이(sec)보다 긴 파일은 가운데 max_duration 구간만 decode. None이면 전체 decode.
+        self.max_duration = max_duration
 
-    def forward(self, wav_files, infer=False):
-        embeds = torch.zeros(len(wav_files), self.speaker_encoder.proj_dim)
-        device = torch.device('cuda' if self.use_cuda else 'cpu')
-        self.speaker_encoder.to(device)
+    def window_bytes(self, num_frames):
+        """
+        LSTM forward 시 window 하나가 차지하는 메모리 대략적 추정치 (bytes, float32).
+        입력 mel + 레이어 당 LSTM gate / hidden 출력 + projection 출력 기준.
+        """
+        input_dim = self.config.model_params["input_dim"]
+        lstm_dim = self.config.model_params["lstm_dim"]
+        proj_dim = self.config.model_params["proj_dim"]
+        return 4 * num_frames * (input_dim + 5 * lstm_dim + proj_dim)
+
+    def load_waveform(self, wav_file):
+        """
+        sample_rate로 resample + silence trim + sound norm 된 waveform 로드.
+        max_duration보다 긴 파일은 가운데 max_duration 구간만 decode.
+        wav_file은 파일 경로, 메모리 상의 (mono waveform, sampling rate) tuple 또는 AudioContext.
+        AudioContext면 sample_rate로 resample 된 view를 공유 (pitch 추정 등 같은 rate를 쓰는 단계와 resample 한 번).
+        """
+        ap = self.speaker_encoder_ap
+        in_memory = isinstance(wav_file, tuple)
+        offset, duration = 0.0, None
+        if self.max_duration is not None:
+            if isinstance(wav_file, AudioContext):
+                total_duration = wav_file.duration
+            else:
+                total_duration = len(wav_file[0]) / wav_file[1] if in_memory else librosa.get_duration(path=wav_file)
+            if total_duration > self.max_duration:
+                offset, duration = (total_duration - self.max_duration) / 2, self.max_duration
+        if isinstance(wav_file, AudioContext):
+            return ap.load_wav_context(wav_file, offset=offset, duration=duration)
+        if in_memory:
+            return ap.load_wav_array(wav_file[0], wav_file[1], sr=ap.sample_rate, offset=offset, duration=duration)
+        return ap.load_wav(wav_file, sr=ap.sample_rate, offset=offset, duration=duration)
+
+    def compute_windows(self, wav_files, num_frames=250, num_eval=10):
+        """
+        파일 별 LSTM 입력 window (num_frames x D tensor 목록) 와 각 window의 sampling 횟수를
+        (file_idx, windows, counts) 형태로 yield.
+        windowed_mel이면 window offset을 먼저 정하고 그 window들이 쓰는 sample 구간만 STFT 함.
+        (전체 mel의 해당 frame과 동일한 값.) window들이 전체 frame보다 많이 덮는 짧은 파일은 전체 mel 계산이 더 쌈.
+        """
+        if not self.windowed_mel:
+            for i, spec in self.compute_specs(wav_files):
+                windows, counts = self.speaker_encoder.get_windows(spec.unsqueeze(0), num_frames, num_eval)
+                yield i, windows, counts
+            return
+
+        ap = self.speaker_encoder_ap
         for i, wav_file in enumerate(wav_files):
-            waveform = self.speaker_encoder_ap.load_wav(wav_file, sr=self.speaker_encoder_ap.sample_rate)
-            spec = self.speaker_encoder_ap.melspectrogram(waveform)
-            spec = torch.from_numpy(spec.T).to(device).unsqueeze(0)
-            embed = self.speaker_encoder.compute_embedding(spec, infer=infer)
-            embeds[i] = embed
-        return embeds
-
-def timbre_enc(wav_path):
-    load_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pretrained_timbre_enc/best_model.pth.tar')
-    loaded_state_dict = torch.load(load_path, map_location='cpu', weights_only=True)
-    use_cuda = torch.cuda.is_available()
-
-    # SpkEncoderHelper 초기화
-    spk_encoder_helper = SpkEncoderHelper(root_path='.', use_cuda=use_cuda)
-    spk_encoder_helper.load_state_dict(loaded_state_dict)
-    spk_encoder_helper.to(torch.device('cuda' if use_cuda else 'cpu'))
-    embeds = spk_encoder_helper.forward([wav_path], infer=True)
-    embedding = embeds[0].detach().cpu().numpy()
-    return embedding
\ No newline at end of file
+            waveform = self.load_waveform(wav_file)
+            max_len = 1 + len(waveform) // ap.hop_length
+            offsets, counts, window_frames = self.speaker_encoder.get_window_offsets(max_len, num_frames, num_eval)
+            if len(offsets) * window_frames >= max_len:
+                spec = self.mel_from_waveform(waveform)
+                windows = [spec[offset:offset + window_frames] for offset in offsets]
+            elif self.use_torch_frontend:
+                segments = np.stack([ap.frame_segment(waveform, offset, window_frames) for offset in offsets])
+                with torch.no_grad():
+                    specs = self.torch_frontend.forward_segments(torch.from_numpy(segments).float().to(self.device))
+                windows = list(specs.transpose(1, 2))
+            else:
+                windows = [torch.from_numpy(ap.melspectrogram_frames(waveform, offset, window_frames).T)
+                           for offset in offsets]
+            yield i, windows, counts
+
+    def mel_from_waveform(self, waveform):
+        """
+        waveform 하나의 전체 normalized mel spectrogram (T x D tensor).
+        """
+        if self.use_torch_frontend:
+            wav = torch.from_numpy(waveform).float().unsqueeze(0).to(self.device)
+            with torch.no_grad():
+                specs, _ = self.torch_frontend(wav)
+            return specs[0].T
+        return torch.from_numpy(self.speaker_encoder_ap.melspectrogram(waveform).T)
+
+    def compute_specs(self, wav_files, frontend_batch_size=8):
+        """
+        파일 별 normalized mel spectrogram (T x D tensor) 를 (file_idx, spec) 형태로 yield.
+        torch front end 사용 시 길이 순으로 정렬해 frontend_batch_size 개씩 padding 후 한 번에 계산.
+        """
+        if not self.use_torch_frontend:
+            for i, wav_file in enumerate(wav_files):
+                yield i, self.mel_from_waveform(self.load_waveform(wav_file))
+            return
+
+        waveforms = [torch.from_numpy(self.load_waveform(wav_file)).float() for wav_file in wav_files]
+        order = sorted(range(len(waveforms)), key=lambda i: len(waveforms[i]))
+        for start in range(0, len(order), frontend_batch_size):
+            group = order[start:start + frontend_batch_size]
+            lengths = torch.tensor([len(waveforms[i]) for i in group])
+            batch = waveforms[group[0]].new_zeros(len(group), int(lengths.max()))
+            for j, i in enumerate(group):
+                batch[j, :lengths[j]] = waveforms[i]
+            with torch.no_grad():
+                specs, frame_lengths = self.torch_frontend(batch.to(self.device), lengths)
+            for j, i in enumerate(group):
+                yield i, specs[j, :, :frame_lengths[j]].T
+
+    def forward(self, wav_files, infer=False, max_batch_size=64, max_batch_mb=512, num_frames=250, num_eval=10):
+        """
+        모든 파일의 window들을 길이(num_frames) 별로 모아 큰 batch로 LSTM에 한 번에 통과시킨 뒤,
+        파일 별로 평균내어 embedding 계산. 결과는 파일 하나씩 compute_embedding 하던 것과 동일.
+        window는 mel의 view로만 들고 있다가 batch 구성 시 한 번만 복사하며, 시작 위치가 같은 window는 한 번만 계산.
+        device 이동은 TimbreEncoder 로드 시 한 번만 수행. 여기서는 입력만 옮김.
+
+        input:
+            - wav_files (List[str | tuple | AudioContext]): wav 파일 경로, (mono waveform, sampling rate) 또는 AudioContext 목록.
+            - max_batch_size (int): LSTM forward 한 번에 넣을 최대 window 수.
+            - max_batch_mb (float): LSTM forward 한 번의 대략적 메모리 상한 (MB). None이면 제한 X.
+            - num_frames (int): window 길이 (mel frame 수).
+            - num_eval (int): 파일 당 평균낼 window 수.
+        """
+        embeds = torch.zeros(len(wav_files), self.speaker_encoder.proj_dim)
+        counts = torch.zeros(len(wav_files), 1)
+
+        # 1. 파일 별 window 추출 후 길이 별 bucket에 모음: {num_frames: [(file_idx, count, window), ...]}
+        buckets = {}
+        for i, windows, window_counts in self.compute_windows(wav_files, num_frames, num_eval):
+            bucket = buckets.setdefault(windows[0].shape[0], [])
+            bucket.extend((i, float(count), window) for window, count in zip(windows, window_counts))
+
+        # 2. bucket 별로 max_batch_size / max_batch_mb 이내의 batch 구성해 forward
+        for bucket_frames, items in buckets.items():
+            batch_size = max_batch_size
+            if max_batch_mb is not None:
+                batch_size = min(batch_size, max(1, int(max_batch_mb * 1024 ** 2 // self.window_bytes(bucket_frames))))
+            for start in range(0, len(items), batch_size):
+                batch_items = items[start:start + batch_size]
+                batch = torch.stack([window for _, _, window in batch_items]).to(self.device)
+                if infer and self.exported_encoder is not None:
+                    embeddings = self.exported_encoder.inference(batch)
+                elif infer:
+                    embeddings = self.speaker_encoder.inference(batch)
+                else:
+                    embeddings = self.speaker_encoder.forward(batch)
+                batch_owners = torch.tensor([i for i, _, _ in batch_items], dtype=torch.long)
+                batch_counts = torch.tensor([[count] for _, count, _ in batch_items])
+                embeds.index_add_(0, batch_owners, embeddings.cpu() * batch_counts)
+                counts.index_add_(0, batch_owners, batch_counts)
+
+        return embeds / counts
+
+
+class TimbreEncoder:
+    """
+    프로세스 당 한 번만 checkpoint / config 로드하고 device 고정하는 timbre encoder 서비스 객체.
+    직접 생성하기보다 get_timbre_encoder()로 공유 인스턴스 받아 쓰는 것을 권장.
+    로드 이후의 encode() 호출은 모델 가중치를 읽기만 하므로 여러 스레드에서 동시에 호출해도 안전함.
+
+    input:
+        - checkpoint_path (str): best_model.pth.tar 경로. None이면 pretrained_timbre_enc 안의 파일 사용.
+        - use_cuda (bool): None이면 torch.cuda.is_available() 값 사용 (quantize 시 CPU).
+        - max_batch_size (int): LSTM forward 한 번에 넣을 최대 window 수 (파일 당 window 10개).
+        - max_batch_mb (float): LSTM forward 한 번의 대략적 메모리 상한 (MB).
+        - use_torch_frontend (bool): True면 librosa 대신 TorchMelSpectrogram으로 batch mel 계산.
+        - quantize (bool): True면 LSTM / Linear 레이어를 int8 dynamic quantization (CPU 전용).
+            fp32 대비 embedding drift는 benchmark.py timbre_quantization으로 확인.
+        - backend (str): 'torch' (eager), 'torchscript', 'onnx' (ONNX Runtime CPU) 중 하나.
+            torchscript / onnx는 export_dir에 export 파일이 없으면 로드 시 한 번 export 함.
+        - export_dir (str): export 파일 경로. None이면 pretrained_timbre_enc/exported.
+        - windowed_mel (bool): True면 embedding에 쓰이는 window 구간만 STFT (결과 동일, 긴 곡에서 CPU / 메모리 절약).
+        - max_duration (float): 이 길이(sec)보다 긴 파일은 가운데 구간만 decode. None이면 전체 사용.
+
+    latency:
+        - cold_start_sec: 생성자 (config 파싱 + AudioProcessor + checkpoint 로드) 소요 시간.
+        - last_call_sec / mean_call_sec: encode() 호출 (warm call) 소요 시간.
+    """
+    def __init__(self, checkpoint_path=None, use_cuda=None, max_batch_size=64, max_batch_mb=512, use_torch_frontend=False,
+                 quantize=False, backend='torch', export_dir=None, windowed_mel=True, max_duration=None):
+        start = time.perf_counter()
+        self.checkpoint_path = checkpoint_path or os.path.join(PRETRAINED_DIR, 'best_model.pth.tar')
+        self.use_cuda = (torch.cuda.is_available() and not quantize) if use_cuda is None else use_cuda
+        self.device = torch.device('cuda' if self.use_cuda else 'cpu')
+        if quantize and self.use_cuda:
+            raise ValueError("int8 dynamic quantization is only supported on CPU. Use use_cuda=False.")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}. Choose one of {BACKENDS}.")
+        if quantize and backend != 'torch':
+            raise ValueError("int8 dynamic quantization is only supported with the 'torch' backend.")
+        self.quantize = quantize
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_batch_mb = max_batch_mb
+
+        loaded_state_dict = torch.load(self.checkpoint_path, map_location='cpu', weights_only=True)
+        self.helper = SpkEncoderHelper(use_cuda=self.use_cuda, use_torch_frontend=use_torch_frontend,
+                                       windowed_mel=windowed_mel, max_duration=max_duration)
+        self.helper.load_state_dict(loaded_state_dict)
+        self.helper.to(self.device)
+        self.helper.eval()
+        self.helper.speaker_encoder.flatten_parameters()
+        if quantize:
+            self.helper.speaker_encoder = quantize_speaker_encoder(self.helper.speaker_encoder)
+        if backend != 'torch':
+            self.helper.exported_encoder = ExportedSpeakerEncoder(
+                self.helper.speaker_encoder,
+                backend,
+                export_dir or os.path.join(PRETRAINED_DIR, 'exported'),
+                source_path=self.checkpoint_path,
+                input_dim=self.helper.config.model_params["input_dim"],
+            )
+
+        self.cold_start_sec = time.perf_counter() - start
+        self.num_calls = 0
+        self.last_call_sec = None
+        self.total_call_sec = 0.0
+        self._stats_lock = threading.Lock()
+        logger.info(f"Timbre encoder loaded on {self.device} ({backend}{', int8' if quantize else ''}) (cold start: {self.cold_start_sec:.3f}s)")
+
+    def encode_batch(self, wav_paths, num_frames=250, num_eval=10):
+        """
+        여러 파일의 timbre embedding 계산.
+        input:
+            - wav_paths: wav 파일 경로, 메모리 상의 (mono waveform, sampling rate) tuple 또는 AudioContext 목록.
+            - num_frames (int): window 길이 (mel frame 수). onnx / torchscript는 export 길이 외에는 eager로 계산.
+            - num_eval (int): 파일 당 평균낼 window 수. 줄이면 빠르지만 embedding 안정성 감소
+              (benchmark.py timbre_num_eval 참조).
+        output:
+            - embeddings (np.ndarray): (len(wav_paths), proj_dim)
+        """
+        start = time.perf_counter()
+        embeds = self.helper.forward(list(wav_paths), infer=True,
+                                     max_batch_size=self.max_batch_size, max_batch_mb=self.max_batch_mb,
+                                     num_frames=num_frames, num_eval=num_eval)
+        embeddings = embeds.detach().cpu().numpy()
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.num_calls += 1
+            self.last_call_sec = elapsed
+            self.total_call_sec += elapsed
+        logger.info(f"Timbre embedding for {len(embeddings)} file(s): {elapsed:.3f}s (warm call)")
+        return embeddings
+
+    def encode(self, wav_path, num_frames=250, num_eval=10):
+        return self.encode_batch([wav_path], num_frames=num_frames, num_eval=num_eval)[0]
+
+    def latency_report(self):
+        mean_call_sec = self.total_call_sec / self.num_calls if self.num_calls else None
+        return {
+            'cold_start_sec': self.cold_start_sec,
+            'num_calls': self.num_calls,
+            'last_call_sec': self.last_call_sec,
+            'mean_call_sec': mean_call_sec,
+        }
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def get_timbre_encoder(**kwargs):
+    """
+    프로세스 전역에서 공유하는 TimbreEncoder 반환. 같은 kwargs 조합에 대해서는 한 번만 로드함.
+    """
+    key = tuple(sorted(kwargs.items()))
+    with _encoders_lock:
+        encoder = _encoders.get(key)
+        if encoder is None:
+            encoder = TimbreEncoder(**kwargs)
+            _encoders[key] = encoder
+    return encoder
+
+
+def timbre_enc(wav_path, encoder=None, num_frames=250, num_eval=10):
+    encoder = encoder or get_timbre_encoder()
+    return encoder.encode(wav_path, num_frames=num_frames, num_eval=num_eval)
@@ -2,13 +2,49 @@
 
 import os
 import sys
+import logging
 sys.path.append(os.path.abspath('.'))
-from src.pitch_detecting.audio_processor import AudioProcessor
+from src.pitch_detecting.audio_processor import AudioProcessor, detect_pitch_ranges
+from src.pitch_detecting.embedding_utils import add_or_search_embedding
 from src.pitch_detecting.faiss_index import FAISSIndex
 from sentence_transformers import SentenceTransformer
 from src.pitch_detecting.vocal_range import VocalRange, KeyShiftCalculator
 
 
+def stack_batched(urls, save_dir, faiss_index, sbert, batch_songs=8, batch_size=512):
+    """
+    URL list를 batch_songs 곡씩 묶어 database에 저장.
+    곡 별로 download / vocal 분리 후, pitch 추정은 묶음 전체 frame을 모아 CREPE 큰 batch로 한 번에 실행 (detect_pitch_ranges).
+    batch_size: CREPE model.predict batch 크기 (곡 단위 처리의 기본값 32보다 크게).
+    """
+    for i in range(0, len(urls), batch_songs):
+        processors = []
+        for url in urls[i:i + batch_songs]:
+            processor = AudioProcessor(url, save_dir)
+            try:
+                processor.download_audio()
+                processor.separate_vocals()
+                processors.append(processor)
+            except Exception as e:
+                logging.error(f"Error occurred while preparing {url} in stack_batched(): {e}")
+                if processor.origin_wav_path:
+                    processor.cleanup_files()
+
+        try:
+            note_ranges = detect_pitch_ranges(processors, batch_size=batch_size)
+        except Exception as e:
+            logging.error(f"Error occurred while detecting pitch ranges in stack_batched(): {e}")
+            note_ranges = [None] * len(processors)
+        for processor, note_range in zip(processors, note_ranges):
+            try:
+                if note_range is not None:
+                    add_or_search_embedding(faiss_index, processor.vocal_source(), sbert,
+                                            processor.yt_id, processor.yt_title, note_range)
+            except Exception as e:
+                logging.error(f"Error occurred while adding {processor.yt_url} in stack_batched(): {e}")
+            finally:
+                processor.cleanup_files()
+        faiss_index.save()
 
 
 if __name__ == "__main__":
@@ -25,6 +61,10 @@ if __name__ == "__main__":
     faiss_index = FAISSIndex(data_path=dir, title_dim=512, timbre_dim=256)
     sbert = SentenceTransformer('distiluse-base-multilingual-cased-v1')
 
-    for url in urls:
-        processor = AudioProcessor(url, dir)
-        processor.process(faiss_index, sbert)
\ No newline at end of file
+    if '--sequential' in sys.argv:
+        # 곡 단위 순차 처리 (이전 방식)
+        for url in urls:
+            processor = AudioProcessor(url, dir)
+            processor.process(faiss_index, sbert)
+    else:
+        stack_batched(urls, dir, faiss_index, sbert)
\ No newline at end of file
@@ -0,0 +1,54 @@
+# tests/test_mel_frontend.py
+# TorchMelSpectrogram (batch) 과 window 단위 melspectrogram_frames / forward_segments가
+# AudioProcessor.melspectrogram (librosa) 전체 mel과 같은지 확인.
+
+import numpy as np
+import pytest
+import torch
+
+from src.timbre_encoding.timbre_encoder import SpkEncoderHelper
+from utils.audio import TorchMelSpectrogram
+
+
+@pytest.fixture(scope='module')
+def ap():
+    return SpkEncoderHelper().speaker_encoder_ap
+
+
+@pytest.fixture(scope='module')
+def waveforms(ap):
+    rng = np.random.RandomState(0)
+    t = np.arange(ap.sample_rate * 4) / ap.sample_rate
+    return [0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.randn(len(t)),
+            0.2 * rng.randn(ap.sample_rate * 3 // 2)]
+
+
+def test_torch_frontend_matches_librosa(ap, waveforms):
+    frontend = TorchMelSpectrogram(ap)
+    lengths = torch.tensor([len(wav) for wav in waveforms])
+    batch = torch.zeros(len(waveforms), int(lengths.max()), dtype=torch.float64)
+    for i, wav in enumerate(waveforms):
+        batch[i, :len(wav)] = torch.from_numpy(wav)
+    with torch.no_grad():
+        specs, frame_lengths = frontend(batch, lengths)
+    for i, wav in enumerate(waveforms):
+        reference = ap.melspectrogram(wav)
+        assert int(frame_lengths[i]) == reference.shape[1]
+        np.testing.assert_allclose(specs[i, :, :frame_lengths[i]].numpy(), reference, atol=1e-5)
+
+
+@pytest.mark.parametrize('start_frame, num_frames', [(0, 50), (37, 60), (None, 40)])
+def test_windowed_mel_matches_full(ap, waveforms, start_frame, num_frames):
+    wav = waveforms[0].astype(np.float32)
+    full = ap.melspectrogram(wav)
+    # None: 신호 끝까지 닿는 마지막 window (reflect padding 구간)
+    start_frame = full.shape[1] - num_frames if start_frame is None else start_frame
+    reference = full[:, start_frame:start_frame + num_frames]
+
+    np.testing.assert_allclose(ap.melspectrogram_frames(wav, start_frame, num_frames), reference, atol=1e-5)
+
+    frontend = TorchMelSpectrogram(ap)
+    segment = torch.from_numpy(ap.frame_segment(wav, start_frame, num_frames)).float().unsqueeze(0)
+    with torch.no_grad():
+        specs = frontend.forward_segments(segment)
+    np.testing.assert_allclose(specs[0].numpy(), reference, atol=1e-4)  # float32
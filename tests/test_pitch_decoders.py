@@ -0,0 +1,51 @@
+# tests/test_pitch_decoders.py
+# banded_viterbi_path (band=11) 가 crepe.core.to_viterbi_cents의 hmmlearn 360-state Viterbi와
+# 같은 log-likelihood / 같은 경로 (동점 경로 선택 포함) 를 내는지 확인.
+
+import numpy as np
+import pytest
+
+from src.pitch_detecting.pitch_decoders import (N_BINS, SELF_EMISSION, banded_viterbi_cents, banded_viterbi_path,
+                                                local_average_cents)
+
+hmm = pytest.importorskip('hmmlearn.hmm')
+
+
+@pytest.fixture(scope='module')
+def crepe_hmm():
+    # crepe.core.to_viterbi_cents와 같은 model
+    xx, yy = np.meshgrid(range(N_BINS), range(N_BINS))
+    transition = np.maximum(12 - abs(xx - yy), 0)
+    transition = transition / np.sum(transition, axis=1)[:, None]
+    emission = np.eye(N_BINS) * SELF_EMISSION + np.ones((N_BINS, N_BINS)) * ((1 - SELF_EMISSION) / N_BINS)
+    model = hmm.CategoricalHMM(N_BINS)
+    model.startprob_, model.transmat_, model.emissionprob_ = np.ones(N_BINS) / N_BINS, transition, emission
+    return model
+
+
+def activations():
+    rng = np.random.RandomState(0)
+    # 동점 경로가 많은 random activation
+    yield rng.rand(300, N_BINS)
+    yield rng.rand(300, N_BINS) ** 4
+    # 천천히 움직이는 melody + noise (argmax가 가끔 다른 bin으로 튐)
+    center = 150 + 40 * np.sin(np.arange(600) / 50) + rng.randn(600).cumsum() * 0.3
+    melody = np.exp(-0.5 * ((np.arange(N_BINS)[None, :] - center[:, None]) / 2) ** 2)
+    yield melody + 0.8 * rng.rand(600, N_BINS)
+
+
+def path_log_likelihood(model, path, observations):
+    log_transmat, log_emission = np.log(model.transmat_), np.log(model.emissionprob_)
+    return (np.log(model.startprob_[path[0]]) + log_transmat[path[:-1], path[1:]].sum()
+            + log_emission[path, observations].sum())
+
+
+@pytest.mark.parametrize('activation', list(activations()))
+def test_banded_viterbi_matches_hmmlearn(crepe_hmm, activation):
+    observations = np.argmax(activation, axis=1)
+    log_likelihood, expected_path = crepe_hmm.decode(observations.reshape(-1, 1), algorithm='viterbi')
+    path = banded_viterbi_path(activation)
+
+    assert path_log_likelihood(crepe_hmm, path, observations) == pytest.approx(log_likelihood, abs=1e-6)
+    np.testing.assert_array_equal(path, expected_path)
+    np.testing.assert_allclose(banded_viterbi_cents(activation), local_average_cents(activation, expected_path))
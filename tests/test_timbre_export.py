@@ -0,0 +1,67 @@
+# tests/test_timbre_export.py
+# TorchScript / ONNX Runtime / int8 backend의 embedding이 eager 모델과 같은지 확인 (random weight checkpoint 사용).
+
+import os
+import numpy as np
+import pytest
+import torch
+
+from src.timbre_encoding.timbre_encoder import SpkEncoderHelper, TimbreEncoder
+
+
+@pytest.fixture(scope='module')
+def checkpoint(tmp_path_factory):
+    torch.manual_seed(0)
+    path = tmp_path_factory.mktemp('ckpt') / 'random.pth'
+    torch.save(SpkEncoderHelper().state_dict(), path)
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def waveforms():
+    rng = np.random.RandomState(0)
+    t = np.arange(16000 * 6) / 16000
+    # 짧은 녹음 (250 frame 미만 -> eager fallback) 과 긴 녹음 모두 포함
+    return [(0.3 * np.sin(2 * np.pi * f0 * t[:n]) + 0.05 * rng.randn(n)).astype(np.float32)
+            for f0, n in ((220, 16000 * 6), (330, 16000 * 2))]
+
+
+def encode(encoder, waveforms):
+    return np.stack([np.asarray(encoder.encode((wav, 16000))) for wav in waveforms])
+
+
+@pytest.fixture(scope='module')
+def eager_embeddings(checkpoint, waveforms):
+    return encode(TimbreEncoder(checkpoint_path=checkpoint, use_cuda=False), waveforms)
+
+
+@pytest.mark.parametrize('backend', ['torchscript', 'onnx'])
+def test_exported_backend_matches_eager(backend, checkpoint, waveforms, eager_embeddings, tmp_path):
+    if backend == 'onnx':
+        pytest.importorskip('onnxruntime')
+    encoder = TimbreEncoder(checkpoint_path=checkpoint, use_cuda=False, backend=backend, export_dir=str(tmp_path))
+    np.testing.assert_allclose(encode(encoder, waveforms), eager_embeddings, rtol=1e-4, atol=1e-5)
+
+
+def test_int8_close_to_eager(checkpoint, waveforms, eager_embeddings):
+    encoder = TimbreEncoder(checkpoint_path=checkpoint, use_cuda=False, quantize=True)
+    embeddings = encode(encoder, waveforms)
+    cosine = np.sum(embeddings * eager_embeddings, axis=1) / (
+        np.linalg.norm(embeddings, axis=1) * np.linalg.norm(eager_embeddings, axis=1))
+    assert cosine.min() > 0.99
+
+
+def test_export_not_reused_across_checkpoints(checkpoint, waveforms, tmp_path):
+    pytest.importorskip('onnxruntime')
+    state_dict = torch.load(checkpoint, weights_only=True)
+    other = str(tmp_path / 'other.pth')
+    torch.save({k: v + 0.01 if v.is_floating_point() else v for k, v in state_dict.items()}, other)
+
+    export_dir = str(tmp_path / 'exported')
+    first = TimbreEncoder(checkpoint_path=checkpoint, use_cuda=False, backend='onnx', export_dir=export_dir)
+    second = TimbreEncoder(checkpoint_path=other, use_cuda=False, backend='onnx', export_dir=export_dir)
+    assert first.helper.exported_encoder.path != second.helper.exported_encoder.path
+    assert len(os.listdir(export_dir)) == 2
+    np.testing.assert_allclose(encode(second, waveforms),
+                               encode(TimbreEncoder(checkpoint_path=other, use_cuda=False), waveforms),
+                               rtol=1e-4, atol=1e-5)
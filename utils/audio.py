@@ -1,3 +1,4 @@
+import threading
 from typing import Dict, Tuple
 
 import librosa
@@ -9,6 +10,8 @@ import soundfile as sf
 import torch
 from torch import nn
 
+from .vad import FrameEnergy
+
 class StandardScaler:
     """StandardScaler for mean-scale normalization with the given mean and scale values."""
 
@@ -56,6 +59,8 @@ class TorchSTFT(nn.Module):  # pylint: disable=abstract-method
         use_mel=False,
         do_amp_to_db=False,
         spec_gain=1.0,
+        center=True,
+        eps=1e-8,
     ):
         super().__init__()
         self.n_fft = n_fft
@@ -69,7 +74,9 @@ class TorchSTFT(nn.Module):  # pylint: disable=abstract-method
         self.use_mel = use_mel
         self.do_amp_to_db = do_amp_to_db
         self.spec_gain = spec_gain
-        self.window = nn.Parameter(getattr(torch, window)(win_length), requires_grad=False)
+        self.center = center
+        self.eps = eps
+        self.register_buffer("window", getattr(torch, window)(win_length, dtype=torch.float64), persistent=False)
         self.mel_basis = None
         if use_mel:
             self._build_mel_basis()
@@ -92,21 +99,23 @@ class TorchSTFT(nn.Module):  # pylint: disable=abstract-method
             padding = int((self.n_fft - self.hop_length) / 2)
             x = torch.nn.functional.pad(x, (padding, padding), mode="reflect")
         # B x D x T x 2
-        o = torch.stft(
-            x.squeeze(1),
-            self.n_fft,
-            self.hop_length,
-            self.win_length,
-            self.window,
-            center=True,
-            pad_mode="reflect",  # compatible with audio.py
-            normalized=False,
-            onesided=True,
-            return_complex=False,
+        o = torch.view_as_real(
+            torch.stft(
+                x.squeeze(1),
+                self.n_fft,
+                self.hop_length,
+                self.win_length,
+                self.window.to(x),
+                center=self.center,
+                pad_mode="reflect",  # compatible with audio.py
+                normalized=False,
+                onesided=True,
+                return_complex=True,
+            )
         )
         M = o[:, :, :, 0]
         P = o[:, :, :, 1]
-        S = torch.sqrt(torch.clamp(M ** 2 + P ** 2, min=1e-8))
+        S = torch.sqrt(torch.clamp(M ** 2 + P ** 2, min=self.eps))
         if self.use_mel:
             S = torch.matmul(self.mel_basis.to(x), S)
         if self.do_amp_to_db:
@@ -114,10 +123,8 @@ class TorchSTFT(nn.Module):  # pylint: disable=abstract-method
         return S
 
     def _build_mel_basis(self):
-        mel_basis = librosa.filters.mel(
-            sr=self.sample_rate, n_fft=self.n_fft, n_mels=self.n_mels, fmin=self.mel_fmin, fmax=self.mel_fmax
-        )
-        self.mel_basis = torch.from_numpy(mel_basis).float()
+        mel_basis = get_mel_basis(self.sample_rate, self.n_fft, self.n_mels, self.mel_fmin, self.mel_fmax)
+        self.mel_basis = torch.tensor(mel_basis, dtype=torch.float32)
 
     @staticmethod
     def _amp_to_db(x, spec_gain=1.0):
@@ -128,6 +135,218 @@ class TorchSTFT(nn.Module):  # pylint: disable=abstract-method
         return torch.exp(x) / spec_gain
 
 
+class TorchMelSpectrogram(nn.Module):  # pylint: disable=abstract-method
+    """Batched torch version of `AudioProcessor.melspectrogram()` built on `TorchSTFT`.
+
+    Reproduces pre-emphasis, the librosa STFT magnitude, the mel projection, `_amp_to_db` and the range
+    normalization of the given `AudioProcessor` on a batch of zero padded waveforms. Each waveform is reflect
+    padded by its own length, so every valid frame matches the NumPy path. Computation runs in the dtype of the
+    input, use float64 for bit-level parity checks. Mean-var scaling (`stats_path`) is not supported.
+
+    Args:
+        ap (AudioProcessor): audio processor whose parameters are reproduced.
+    """
+
+    def __init__(self, ap):
+        super().__init__()
+        assert not hasattr(ap, "mel_scaler"), " [!] Mean-var scaling is not supported by TorchMelSpectrogram."
+        self.hop_length = ap.hop_length
+        self.pad = ap.fft_size // 2
+        self.stft_pad_mode = ap.stft_pad_mode
+        self.preemphasis = ap.preemphasis
+        self.do_amp_to_db = ap.do_amp_to_db_mel
+        self.spec_gain = ap.spec_gain
+        self.base = ap.base
+        self.signal_norm = ap.signal_norm
+        self.symmetric_norm = ap.symmetric_norm
+        self.clip_norm = ap.clip_norm
+        self.max_norm = ap.max_norm
+        self.ref_level_db = ap.ref_level_db
+        self.min_level_db = ap.min_level_db
+        self.stft = TorchSTFT(
+            n_fft=ap.fft_size,
+            hop_length=ap.hop_length,
+            win_length=ap.win_length,
+            sample_rate=ap.sample_rate,
+            mel_fmin=ap.mel_fmin,
+            mel_fmax=ap.mel_fmax,
+            n_mels=ap.num_mels,
+            use_mel=True,
+            center=False,
+            eps=0.0,
+        )
+
+    def forward(self, x, lengths=None):
+        """Compute normalized melspectrograms.
+
+        Args:
+            x (Tensor): zero padded waveforms.
+            lengths (Tensor, optional): number of valid samples per waveform. Defaults to the padded length.
+
+        Returns:
+            Tuple[Tensor, Tensor]: melspectrograms and number of valid frames per waveform.
+
+        Shapes:
+            x: [B, T]
+            lengths: [B]
+            outputs: [B, C, T_frames], [B]
+        """
+        if lengths is None:
+            lengths = torch.full((x.shape[0],), x.shape[1], dtype=torch.long)
+        if self.preemphasis != 0:
+            x = torch.cat([x[:, :1], x[:, 1:] - self.preemphasis * x[:, :-1]], dim=1)
+        # reflect pad every waveform at its own boundaries (same as `center=True` in librosa)
+        padded = x.new_zeros(x.shape[0], x.shape[1] + 2 * self.pad)
+        for i, length in enumerate(lengths.tolist()):
+            wav = x[i : i + 1, :length].unsqueeze(0)
+            padded[i, : length + 2 * self.pad] = nn.functional.pad(wav, (self.pad, self.pad), mode=self.stft_pad_mode)[0, 0]
+        frame_lengths = 1 + torch.div(lengths, self.hop_length, rounding_mode="floor")
+        return self.forward_segments(padded), frame_lengths
+
+    def forward_segments(self, segments):
+        """Compute normalized melspectrograms of already pre-emphasized and padded sample segments, e.g. the
+        output of `AudioProcessor.frame_segment()`. Every `hop_length` step of a segment is one frame.
+
+        Shapes:
+            segments: [B, T]
+            outputs: [B, C, T_frames]
+        """
+        S = self.stft(segments)
+        if self.do_amp_to_db:
+            S = torch.clamp(S, min=1e-5)
+            S = self.spec_gain * (torch.log10(S) if self.base == 10 else torch.log(S))
+        return self.normalize(S)
+
+    def normalize(self, S):
+        """Torch version of `AudioProcessor.normalize()` for the range normalization."""
+        if not self.signal_norm:
+            return S
+        S = S - self.ref_level_db
+        S_norm = (S - self.min_level_db) / (-self.min_level_db)
+        if self.symmetric_norm:
+            S_norm = ((2 * self.max_norm) * S_norm) - self.max_norm
+            if self.clip_norm:
+                S_norm = torch.clamp(S_norm, -self.max_norm, self.max_norm)
+        else:
+            S_norm = self.max_norm * S_norm
+            if self.clip_norm:
+                S_norm = torch.clamp(S_norm, 0, self.max_norm)
+        return S_norm
+
+
+_MEL_BASIS_CACHE = {}
+_INV_MEL_BASIS_CACHE = {}
+_MEL_BASIS_LOCK = threading.Lock()
+
+
+def get_mel_basis(sample_rate, fft_size, num_mels, mel_fmin, mel_fmax) -> np.ndarray:
+    """Build a melspectrogram basis once per parameter tuple and share it across the process.
+
+    The returned array is read-only since every `AudioProcessor` / `TorchSTFT` with the same parameters uses it.
+
+    Returns:
+        np.ndarray: melspectrogram basis.
+    """
+    key = (sample_rate, fft_size, num_mels, mel_fmin, mel_fmax)
+    with _MEL_BASIS_LOCK:
+        mel_basis = _MEL_BASIS_CACHE.get(key)
+        if mel_basis is None:
+            mel_basis = librosa.filters.mel(sr=sample_rate, n_fft=fft_size, n_mels=num_mels, fmin=mel_fmin, fmax=mel_fmax)
+            mel_basis.setflags(write=False)
+            _MEL_BASIS_CACHE[key] = mel_basis
+    return mel_basis
+
+
+def get_inv_mel_basis(sample_rate, fft_size, num_mels, mel_fmin, mel_fmax) -> np.ndarray:
+    """Pseudo-inverse of `get_mel_basis()`, computed on first use and shared across the process.
+
+    Returns:
+        np.ndarray: inverse melspectrogram basis.
+    """
+    key = (sample_rate, fft_size, num_mels, mel_fmin, mel_fmax)
+    mel_basis = get_mel_basis(*key)
+    with _MEL_BASIS_LOCK:
+        inv_mel_basis = _INV_MEL_BASIS_CACHE.get(key)
+        if inv_mel_basis is None:
+            inv_mel_basis = np.linalg.pinv(mel_basis)
+            inv_mel_basis.setflags(write=False)
+            _INV_MEL_BASIS_CACHE[key] = inv_mel_basis
+    return inv_mel_basis
+
+
+class AudioContext:
+    """Decoded mono waveform of one track, shared by every analysis stage of a request.
+
+    The waveform is decoded once and each resampled view is computed on first use and memoized per target
+    sampling rate, so stages that need the same rate (e.g. CREPE and the timbre encoder at 16 kHz) share it.
+    Views must be treated as read-only.
+
+    Args:
+        wav (np.ndarray): Mono waveform.
+        sr (int): Sampling rate of `wav`.
+        name (str, optional): Name used in log messages. Defaults to "<in-memory waveform>".
+    """
+
+    def __init__(self, wav: np.ndarray, sr: int, name: str = "<in-memory waveform>") -> None:
+        self.sr = sr
+        self.name = name
+        self.num_resamples = 0
+        self._views = {sr: np.asarray(wav, dtype=np.float32)}
+        self._source = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, filename: str) -> "AudioContext":
+        """Decode a whole audio file (downmixed to mono) at its native sampling rate."""
+        x, sr = sf.read(filename, dtype="float32", always_2d=True)
+        return cls(x.mean(axis=1), sr, name=filename)
+
+    @property
+    def wav(self) -> np.ndarray:
+        """Waveform at the native sampling rate."""
+        return self._views[self.sr]
+
+    @property
+    def duration(self) -> float:
+        return len(self.wav) / self.sr
+
+    def resampled(self, sr: int = None) -> np.ndarray:
+        """Waveform at `sr` (native rate if None), resampled on first request only.
+
+        Args:
+            sr (int, optional): Target sampling rate. Defaults to None.
+
+        Returns:
+            np.ndarray: Memoized waveform at `sr`.
+        """
+        sr = sr or self.sr
+        with self._lock:
+            if sr not in self._views:
+                if self._source is None:
+                    self._views[sr] = librosa.resample(self.wav, orig_sr=self.sr, target_sr=sr)
+                    self.num_resamples += 1
+                else:
+                    parent, ranges = self._source
+                    x = parent.resampled(sr)
+                    self._views[sr] = np.concatenate([x[int(start * sr):int(end * sr)] for start, end in ranges])
+            return self._views[sr]
+
+    def excerpts(self, ranges) -> "AudioContext":
+        """Context of the concatenated (start_sec, end_sec) excerpts, built from this context's resampled views.
+
+        Args:
+            ranges (list): Non-overlapping (start_sec, end_sec) ranges.
+
+        Returns:
+            AudioContext: Excerpt context. Resampling it resamples (and memoizes) this context instead.
+        """
+        ranges = [tuple(r) for r in ranges]
+        context = AudioContext(np.concatenate([self.wav[int(start * self.sr):int(end * self.sr)] for start, end in ranges]),
+                               self.sr, name=self.name)
+        context._source = (self, ranges)
+        return context
+
+
 # pylint: disable=too-many-public-methods
 class AudioProcessor(object):
     """Audio Processor for TTS used by all the data pipelines.
@@ -309,9 +528,8 @@ class AudioProcessor(object):
             print(" > Setting up Audio Processor...")
             # for key, value in members.items():
             #     print(" | > {}:{}".format(key, value))
-        # create spectrogram utils
+        # create spectrogram utils (shared per parameter tuple, inverse basis is built lazily)
         self.mel_basis = self._build_mel_basis()
-        self.inv_mel_basis = np.linalg.pinv(self._build_mel_basis())
         # setup scaler
         if stats_path and signal_norm:
             mel_mean, mel_std, linear_mean, linear_std, _ = self.load_stats(stats_path)
@@ -332,9 +550,16 @@ class AudioProcessor(object):
         """
         if self.mel_fmax is not None:
             assert self.mel_fmax <= self.sample_rate // 2
-        return librosa.filters.mel(
-            sr=self.sample_rate, n_fft=self.fft_size, n_mels=self.num_mels, fmin=self.mel_fmin, fmax=self.mel_fmax
-        )
+        return get_mel_basis(self.sample_rate, self.fft_size, self.num_mels, self.mel_fmin, self.mel_fmax)
+
+    @property
+    def inv_mel_basis(self) -> np.ndarray:
+        """Pseudo-inverse of the melspectrogram basis. Only Griffin-Lim needs it, so it is computed on first use.
+
+        Returns:
+            np.ndarray: inverse melspectrogram basis.
+        """
+        return get_inv_mel_basis(self.sample_rate, self.fft_size, self.num_mels, self.mel_fmin, self.mel_fmax)
 
     def _stft_parameters(
         self,
@@ -570,6 +795,42 @@ class AudioProcessor(object):
             S = self._linear_to_mel(np.abs(D))
         return self.normalize(S).astype(np.float32)
 
+    def frame_segment(self, y: np.ndarray, start_frame: int, num_frames: int) -> np.ndarray:
+        """Collect only the samples needed for frames `[start_frame, start_frame + num_frames)` of
+        `melspectrogram(y)`, pre-emphasized and reflect padded exactly like the full signal.
+
+        `_stft(segment)` with `center=False` yields the same frames as slicing the full STFT.
+
+        Args:
+            y (np.ndarray): Waveform.
+            start_frame (int): First STFT frame (hop index).
+            num_frames (int): Number of frames.
+
+        Returns:
+            np.ndarray: Sample segment of length `(num_frames - 1) * hop_length + fft_size`.
+        """
+        pad = self.fft_size // 2
+        idx = np.arange(start_frame * self.hop_length, (start_frame + num_frames - 1) * self.hop_length + self.fft_size)
+        idx -= pad
+        # reflect padding (same as `center=True`, `pad_mode="reflect"`)
+        idx = np.abs(idx)
+        idx = np.where(idx >= len(y), 2 * (len(y) - 1) - idx, idx)
+        segment = y[idx].astype(np.float64)
+        if self.preemphasis == 0:
+            return segment
+        prev = y[np.maximum(idx - 1, 0)].astype(np.float64)
+        return np.where(idx > 0, segment - self.preemphasis * prev, segment)
+
+    def melspectrogram_frames(self, y: np.ndarray, start_frame: int, num_frames: int) -> np.ndarray:
+        """Compute frames `[start_frame, start_frame + num_frames)` of `melspectrogram(y)` from only the samples
+        they cover. Much cheaper than the full melspectrogram when only a few windows of a long signal are used."""
+        D = self._stft(self.frame_segment(y, start_frame, num_frames), center=False)
+        if self.do_amp_to_db_mel:
+            S = self._amp_to_db(self._linear_to_mel(np.abs(D)))
+        else:
+            S = self._linear_to_mel(np.abs(D))
+        return self.normalize(S).astype(np.float32)
+
     def inv_spectrogram(self, spectrogram: np.ndarray) -> np.ndarray:
         """Convert a spectrogram to a waveform using Griffi-Lim vocoder."""
         S = self.denormalize(spectrogram)
@@ -605,11 +866,12 @@ class AudioProcessor(object):
         return mel
 
     ### STFT and ISTFT ###
-    def _stft(self, y: np.ndarray) -> np.ndarray:
+    def _stft(self, y: np.ndarray, center: bool = True) -> np.ndarray:
         """Librosa STFT wrapper.
 
         Args:
             y (np.ndarray): Audio signal.
+            center (bool, optional): Pad the signal so that frames are centered. Defaults to True.
 
         Returns:
             np.ndarray: Complex number array.
@@ -621,7 +883,7 @@ class AudioProcessor(object):
             win_length=self.win_length,
             pad_mode=self.stft_pad_mode,
             window="hann",
-            center=True,
+            center=center,
         )
 
     def _istft(self, y: np.ndarray) -> np.ndarray:
@@ -703,21 +965,15 @@ class AudioProcessor(object):
         Returns:
             int: Last point without silence.
         """
-        window_length = int(self.sample_rate * min_silence_sec)
-        hop_length = int(window_length / 4)
         threshold = self._db_to_amp(threshold_db)
-        for x in range(hop_length, len(wav) - window_length, hop_length):
-            if np.max(wav[x : x + window_length]) < threshold:
-                return x + hop_length
-        return len(wav)
+        return FrameEnergy(wav, self.sample_rate).find_endpoint(threshold, min_silence_sec)
 
     def trim_silence(self, wav):
         """Trim silent parts with a threshold and 0.01 sec margin"""
         margin = int(self.sample_rate * 0.01)
         wav = wav[margin:-margin]
-        return librosa.effects.trim(wav, top_db=self.trim_db, frame_length=self.win_length, hop_length=self.hop_length)[
-            0
-        ]
+        start, end = FrameEnergy(wav, self.sample_rate).trim_bounds(self.trim_db, self.win_length, self.hop_length)
+        return wav[start:end]
 
     @staticmethod
     def sound_norm(x: np.ndarray) -> np.ndarray:
@@ -732,28 +988,77 @@ class AudioProcessor(object):
         return x / abs(x).max() * 0.95
 
     ### save and load ###
-    def load_wav(self, filename: str, sr: int = None) -> np.ndarray:
+    def load_wav(self, filename: str, sr: int = None, offset: float = 0.0, duration: float = None) -> np.ndarray:
         """Read a wav file using Librosa and optionally resample, silence trim, volume normalize.
 
         Args:
             filename (str): Path to the wav file.
             sr (int, optional): Sampling rate for resampling. Defaults to None.
+            offset (float, optional): Start reading after this time (in seconds). Defaults to 0.0.
+            duration (float, optional): Only decode this much audio (in seconds). Defaults to None.
 
         Returns:
             np.ndarray: Loaded waveform.
         """
         if self.resample:
-            x, sr = librosa.load(filename, sr=self.sample_rate)
+            x, sr = librosa.load(filename, sr=self.sample_rate, offset=offset, duration=duration)
         elif sr is None:
-            x, sr = sf.read(filename)
+            info = sf.info(filename)
+            start = int(offset * info.samplerate)
+            stop = None if duration is None else start + int(duration * info.samplerate)
+            x, sr = sf.read(filename, start=start, stop=stop)
             assert self.sample_rate == sr, "%s vs %s" % (self.sample_rate, sr)
         else:
-            x, sr = librosa.load(filename, sr=sr)
+            x, sr = librosa.load(filename, sr=sr, offset=offset, duration=duration)
+        return self._trim_and_normalize(x, filename)
+
+    def load_wav_array(
+        self, x: np.ndarray, orig_sr: int, sr: int = None, offset: float = 0.0, duration: float = None
+    ) -> np.ndarray:
+        """Same as `load_wav` for a mono waveform that is already in memory, so no file is written or read.
+
+        Args:
+            x (np.ndarray): Mono waveform.
+            orig_sr (int): Sampling rate of `x`.
+            sr (int, optional): Sampling rate for resampling. Defaults to None.
+            offset (float, optional): Start after this time (in seconds). Defaults to 0.0.
+            duration (float, optional): Only use this much audio (in seconds). Defaults to None.
+
+        Returns:
+            np.ndarray: Processed waveform.
+        """
+        start = int(offset * orig_sr)
+        stop = None if duration is None else start + int(duration * orig_sr)
+        x = x[start:stop]
+        target_sr = self.sample_rate if self.resample else sr
+        if target_sr is None:
+            assert self.sample_rate == orig_sr, "%s vs %s" % (self.sample_rate, orig_sr)
+        elif target_sr != orig_sr:
+            x = librosa.resample(x, orig_sr=orig_sr, target_sr=target_sr)
+        return self._trim_and_normalize(x, "<in-memory waveform>")
+
+    def load_wav_context(self, context: "AudioContext", offset: float = 0.0, duration: float = None) -> np.ndarray:
+        """Same as `load_wav_array` for an `AudioContext`, reusing its memoized view at `sample_rate`.
+
+        Args:
+            context (AudioContext): Decoded track.
+            offset (float, optional): Start after this time (in seconds). Defaults to 0.0.
+            duration (float, optional): Only use this much audio (in seconds). Defaults to None.
+
+        Returns:
+            np.ndarray: Processed waveform.
+        """
+        x = context.resampled(self.sample_rate)
+        start = int(offset * self.sample_rate)
+        stop = None if duration is None else start + int(duration * self.sample_rate)
+        return self._trim_and_normalize(x[start:stop], context.name)
+
+    def _trim_and_normalize(self, x: np.ndarray, name: str) -> np.ndarray:
         if self.do_trim_silence:
             try:
                 x = self.trim_silence(x)
             except ValueError:
-                print(f" [!] File cannot be trimmed for silence - {filename}")
+                print(f" [!] File cannot be trimmed for silence - {name}")
         if self.do_sound_norm:
             x = self.sound_norm(x)
         return x
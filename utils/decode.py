@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import subprocess
+from typing import Tuple
+
+import numpy as np
+
+# ffmpeg / ffprobe executables (system ffmpeg by default, also needed by yt_dlp and pydub).
+# Without them, only formats libsndfile reads (wav, flac, ogg/vorbis, aiff, ...) can be decoded, through soundfile.
+FFMPEG = os.environ.get("NORAEHE_FFMPEG", "ffmpeg")
+FFPROBE = os.environ.get("NORAEHE_FFPROBE", "ffprobe")
+# lossy decoders (mp3, aac, opus) need some audio before a seek point to settle; seek this much earlier and drop it
+SEEK_PREROLL = 0.5
+
+
+def _soundfile_info(filename: str, executable: str):
+    """soundfile header of a file read without the missing `executable`, with a clear error if libsndfile cannot read it."""
+    import soundfile as sf
+
+    try:
+        return sf.info(filename)
+    except RuntimeError as e:
+        raise RuntimeError(
+            f"{executable!r} not found and soundfile cannot read {filename} ({e}). "
+            "Install ffmpeg or point NORAEHE_FFMPEG / NORAEHE_FFPROBE at its executables."
+        ) from e
+
+
+def probe_audio(filename: str) -> Tuple[int, int, float]:
+    """Native format of the first audio stream of a file, read with ffprobe (soundfile if ffprobe is not installed).
+
+    Args:
+        filename (str): Path or URL of any ffmpeg-readable file.
+
+    Returns:
+        Tuple[int, int, float]: (sampling rate, number of channels, duration in seconds or NaN if unknown).
+    """
+    if shutil.which(FFPROBE) is None:
+        info = _soundfile_info(filename, FFPROBE)
+        return info.samplerate, info.channels, info.duration
+    cmd = [FFPROBE, "-v", "error", "-select_streams", "a:0", "-show_entries",
+           "stream=sample_rate,channels:format=duration", "-of", "json", filename]
+    result = subprocess.run(cmd, capture_output=True, check=False)
+    if result.returncode:
+        raise RuntimeError(f"ffprobe failed on {filename}: {result.stderr.decode(errors='replace').strip()}")
+    info = json.loads(result.stdout)
+    if not info.get("streams"):
+        raise RuntimeError(f"No audio stream in {filename}")
+    stream = info["streams"][0]
+    return int(stream["sample_rate"]), int(stream["channels"]), float(info.get("format", {}).get("duration", "nan"))
+
+
+def _decode_soundfile(filename: str, sr: int, channels: int, offset: float, duration: float) -> Tuple[np.ndarray, int]:
+    """decode_audio without ffmpeg: read the window with soundfile, then remix and resample (soxr) like ffmpeg would."""
+    import librosa
+    import soundfile as sf
+
+    info = _soundfile_info(filename, FFMPEG)
+    start = int(round(offset * info.samplerate))
+    frames = -1 if duration is None else int(round(duration * info.samplerate))
+    wav, _ = sf.read(filename, start=start, frames=frames, dtype="float32", always_2d=True)
+    wav = wav.T
+    sr, channels = sr or info.samplerate, channels or info.channels
+    if channels != len(wav):
+        # equal-power remix through mono, which matches ffmpeg -ac between mono and stereo (-3 dB each way)
+        mono = wav.sum(axis=0, keepdims=True) / np.sqrt(len(wav))
+        wav = np.repeat(mono / np.sqrt(channels), channels, axis=0)
+    if sr != info.samplerate:
+        wav = librosa.resample(wav, orig_sr=info.samplerate, target_sr=sr)
+    return np.ascontiguousarray(wav, dtype=np.float32), sr
+
+
+def decode_audio(
+    filename: str, sr: int = None, channels: int = None, offset: float = 0.0, duration: float = None,
+    chunk_bytes: int = 1 << 20,
+) -> Tuple[np.ndarray, int]:
+    """Decode any ffmpeg-readable audio (wav, flac, mp3, m4a, webm, ...) into a float32 array through a pipe.
+
+    ffmpeg resamples and remixes to the requested layout and streams raw f32le samples to stdout, which are
+    read into a single growing buffer, so no intermediate file is written. If ffmpeg is not installed, files that
+    libsndfile reads (wav, flac, ogg/vorbis, ...) are decoded with soundfile and resampled with librosa instead,
+    and anything else raises a RuntimeError asking for ffmpeg.
+
+    Args:
+        filename (str): Path or URL of the file.
+        sr (int, optional): Target sampling rate. Defaults to None (native rate, probed with ffprobe).
+        channels (int, optional): Target number of channels. Defaults to None (native layout, probed with ffprobe).
+        offset (float, optional): Start at this time (in seconds). Seeks `SEEK_PREROLL` earlier and discards the
+            pre-roll, so the window matches the same samples of a full decode. Offsets follow container timestamps,
+            so for streams with a codec delay (e.g. opus in webm) the window is a few ms off the full decode.
+            Defaults to 0.0.
+        duration (float, optional): Only decode this much audio (in seconds). Defaults to None.
+        chunk_bytes (int, optional): Pipe read size. Defaults to 1 MB.
+
+    Returns:
+        Tuple[np.ndarray, int]: (channels x samples float32 waveform, sampling rate).
+    """
+    if shutil.which(FFMPEG) is None:
+        return _decode_soundfile(filename, sr, channels, offset, duration)
+    if sr is None or channels is None:
+        native_sr, native_channels, _ = probe_audio(filename)
+        sr, channels = sr or native_sr, channels or native_channels
+
+    cmd = [FFMPEG, "-nostdin", "-v", "error"]
+    seek = max(0.0, offset - SEEK_PREROLL)
+    if seek:
+        cmd += ["-ss", str(seek)]
+    cmd += ["-i", filename]
+    if offset > seek:
+        cmd += ["-ss", str(offset - seek)]
+    if duration is not None:
+        cmd += ["-t", str(duration)]
+    cmd += ["-map", "0:a:0", "-f", "f32le", "-acodec", "pcm_f32le", "-ac", str(channels), "-ar", str(sr), "pipe:1"]
+
+    buffer = bytearray()
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
+        while True:
+            chunk = proc.stdout.read(chunk_bytes)
+            if not chunk:
+                break
+            buffer += chunk
+        error = proc.stderr.read()
+    if proc.returncode:
+        raise RuntimeError(f"ffmpeg failed to decode {filename}: {error.decode(errors='replace').strip()}")
+
+    wav = np.frombuffer(buffer, dtype="<f4")
+    wav = wav[: len(wav) - len(wav) % channels].reshape(-1, channels).T
+    return wav, sr
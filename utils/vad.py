@@ -0,0 +1,130 @@
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+def frame_rms(y: np.ndarray, frame_length: int = 2048, hop_length: int = 512) -> np.ndarray:
+    """Vectorized frame RMS energy, same framing as `librosa.feature.rms` (centered, zero padded).
+
+    Uses a cumulative sum of squares so every sample is touched once, independent of `frame_length / hop_length`.
+
+    Args:
+        y (np.ndarray): Mono waveform.
+        frame_length (int, optional): Frame length in samples. Defaults to 2048.
+        hop_length (int, optional): Hop length in samples. Defaults to 512.
+
+    Returns:
+        np.ndarray: RMS value of each frame.
+    """
+    pad = frame_length // 2
+    power = np.zeros(len(y) + 2 * pad + 1)
+    np.cumsum(np.square(y, dtype=np.float64), out=power[pad + 1 : pad + 1 + len(y)])
+    power[pad + 1 + len(y) :] = power[pad + len(y)]
+    num_frames = 1 + (len(y) + 2 * pad - frame_length) // hop_length
+    starts = np.arange(num_frames) * hop_length
+    mean_power = (power[starts + frame_length] - power[starts]) / frame_length
+    return np.sqrt(np.maximum(mean_power, 0.0))
+
+
+def frame_peak(y: np.ndarray, window_length: int, hop_length: int, start: int = 0) -> np.ndarray:
+    """Maximum sample value of windows `y[x : x + window_length]` for `x = start, start + hop_length, ...`
+
+    Args:
+        y (np.ndarray): Mono waveform.
+        window_length (int): Window length in samples.
+        hop_length (int): Hop length in samples.
+        start (int, optional): First window start. Defaults to 0.
+
+    Returns:
+        np.ndarray: Peak value of each window.
+    """
+    if len(y) - start < window_length:
+        return np.zeros(0, dtype=y.dtype)
+    windows = np.lib.stride_tricks.sliding_window_view(y[start:], window_length)[::hop_length]
+    return windows.max(axis=1)
+
+
+def voiced_segments(mask: np.ndarray) -> np.ndarray:
+    """Turn a boolean frame mask into `[start, end)` index pairs of consecutive True runs.
+
+    Args:
+        mask (np.ndarray): Boolean voiced mask.
+
+    Returns:
+        np.ndarray: `[N, 2]` integer array of segment boundaries.
+    """
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.stack([np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)], axis=1)
+
+
+class FrameEnergy:
+    """Frame energy of one waveform, computed once per `(frame_length, hop_length)` and shared by silence trimming,
+    endpoint detection and RMS gating.
+
+    Args:
+        y (np.ndarray): Mono waveform.
+        sample_rate (int): Sampling rate of `y`.
+        offset (int, optional): Index of `y[0]` in the full signal when `y` is one chunk of a longer recording.
+            Only shifts `times()` / `rms_at()`; sample bounds stay relative to `y`. Defaults to 0.
+    """
+
+    def __init__(self, y: np.ndarray, sample_rate: int, offset: int = 0) -> None:
+        self.y = y
+        self.sample_rate = sample_rate
+        self.offset = offset
+        self._rms: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def rms(self, frame_length: int = 2048, hop_length: int = 512) -> np.ndarray:
+        """Cached `frame_rms()` of the waveform."""
+        key = (frame_length, hop_length)
+        if key not in self._rms:
+            self._rms[key] = frame_rms(self.y, frame_length, hop_length)
+        return self._rms[key]
+
+    def times(self, frame_length: int = 2048, hop_length: int = 512) -> np.ndarray:
+        """Time (in seconds) of every frame returned by `rms()`."""
+        return (np.arange(len(self.rms(frame_length, hop_length))) * hop_length + self.offset) / self.sample_rate
+
+    def rms_at(self, times: np.ndarray, frame_length: int = 2048, hop_length: int = 512) -> np.ndarray:
+        """Frame RMS linearly interpolated at arbitrary times, e.g. pitch tracker frame times."""
+        return np.interp(times, self.times(frame_length, hop_length), self.rms(frame_length, hop_length))
+
+    def db(self, frame_length: int = 2048, hop_length: int = 512, amin: float = 1e-5) -> np.ndarray:
+        """Frame energy in decibels relative to the loudest frame (same as `librosa.amplitude_to_db(rms, ref=np.max)`)."""
+        rms = self.rms(frame_length, hop_length)
+        ref = np.max(rms) if len(rms) else amin
+        return 20.0 * np.log10(np.maximum(amin, rms)) - 20.0 * np.log10(np.maximum(amin, ref))
+
+    def voiced_mask(self, threshold: float, frame_length: int = 2048, hop_length: int = 512) -> np.ndarray:
+        """Frames whose RMS is at least `threshold` (linear amplitude)."""
+        return self.rms(frame_length, hop_length) >= threshold
+
+    def voiced_segments(self, threshold: float, frame_length: int = 2048, hop_length: int = 512) -> np.ndarray:
+        """`[start, end)` frame indices of consecutive frames with RMS >= `threshold`."""
+        return voiced_segments(self.voiced_mask(threshold, frame_length, hop_length))
+
+    def trim_bounds(self, top_db: float = 60, frame_length: int = 2048, hop_length: int = 512) -> Tuple[int, int]:
+        """Sample bounds of the non-silent part, same rule as `librosa.effects.trim`.
+
+        Returns:
+            Tuple[int, int]: start and end sample (end exclusive).
+        """
+        non_silent = np.flatnonzero(self.db(frame_length, hop_length) > -top_db)
+        if non_silent.size == 0:
+            return 0, 0
+        return int(non_silent[0] * hop_length), min(len(self.y), int((non_silent[-1] + 1) * hop_length))
+
+    def find_endpoint(self, threshold: float, min_silence_sec: float = 0.8) -> int:
+        """Sample index of the first window of `min_silence_sec` whose peak stays below `threshold`.
+
+        Returns:
+            int: Last point without silence, `len(y)` if there is none.
+        """
+        window_length = int(self.sample_rate * min_silence_sec)
+        hop_length = int(window_length / 4)
+        starts = np.arange(hop_length, len(self.y) - window_length, hop_length)
+        peaks = frame_peak(self.y, window_length, hop_length, start=hop_length)[: len(starts)]
+        silent = np.flatnonzero(peaks < threshold)
+        if silent.size == 0:
+            return len(self.y)
+        return int(starts[silent[0]] + hop_length)